@@ -20,7 +20,8 @@ Edges between objects represent spatial relationships between objects in the ima
 
 from functools import partial
 from collections import Counter
-from itertools import combinations
+
+import numpy as np
 
 from common.grid import Grid
 from competition.loader import Task
@@ -40,7 +41,7 @@ VERTICAL = "vertical"
 BOTH = "both"
 
 
-def connected_objects(grid: Grid, univalued: bool, diagonal: bool, bg_colour: int):
+def connected_objects_dsl(grid: Grid, univalued: bool, diagonal: bool, bg_colour: int):
     " code based off of michod's DSL "
     objs = []
     occupied = set()
@@ -70,27 +71,133 @@ def connected_objects(grid: Grid, univalued: bool, diagonal: bool, bg_colour: in
     return objs
 
 
-def connected_objects_uni(grid: Grid, do_diagonals: bool, bg_colour: int):
-    objs = connected_objects(grid, True, do_diagonals, bg_colour)
+# the order connected_objects_dsl() discovers objects in, which is the iteration order of
+# dsl.asindices() - only depends on the shape of the grid.  shape -> flat index -> rank
+asindices_ranks = {}
 
-    # transform [(colour, coord)...] -> (colour, coords)
-    result = []
-    for obj in objs:
-        # convert obj to list
-        obj = list(obj)
 
-        # fish colour
-        colour = obj[0][0]
+def get_asindices_rank(shape):
+    if shape not in asindices_ranks:
+        h, w = shape
+        rank = np.empty(h * w, dtype=np.intp)
+        for r, (i, j) in enumerate(dsl.asindices(np.zeros(shape, dtype=np.int8))):
+            rank[i * w + j] = r
+        asindices_ranks[shape] = rank
+
+    return asindices_ranks[shape]
+
+
+def label_components(values, univalued: bool, diagonal: bool, bg_colour: int):
+    """
+    connected component labelling of a 2d numpy array, using union-find over the flattened
+    indices (all pairs of neighbours are hooked at once, followed by pointer jumping).
+
+    returns list of (colours, coords) per object - both python lists, coords in row major order.
+    Objects are in the same order as connected_objects_dsl() finds them.
+    """
+    h, w = values.shape
+    flat = values.ravel()
+    valid = flat != bg_colour
+    index = np.arange(h * w).reshape(h, w)
 
-        # convert cords
-        coords = [coord for _, coord in obj]
+    # pairs of neighbouring pixels (a, b), looking right/down (and diagonally down) only
+    pairs = [(index[:, :-1], index[:, 1:]), (index[:-1, :], index[1:, :])]
+    if diagonal:
+        pairs += [(index[:-1, :-1], index[1:, 1:]), (index[:-1, 1:], index[1:, :-1])]
 
-        result.append((colour, coords))
+    a = np.concatenate([p.ravel() for p, _ in pairs])
+    b = np.concatenate([p.ravel() for _, p in pairs])
+    connected = valid[a] & valid[b]
+    if univalued:
+        connected &= flat[a] == flat[b]
+    a, b = a[connected], b[connected]
 
+    # every pixel points at the lowest index in its component
+    parent = np.arange(h * w)
+    while True:
+        pa, pb = parent[a], parent[b]
+        if (pa == pb).all():
+            break
+        np.minimum.at(parent, np.maximum(pa, pb), np.minimum(pa, pb))
+
+        while True:
+            grandparent = parent[parent]
+            if (grandparent == parent).all():
+                break
+            parent = grandparent
+
+    pixels = np.nonzero(valid)[0]
+    if len(pixels) == 0:
+        return []
+
+    roots = parent[pixels]
+
+    # order as connected_objects_dsl() does: by first pixel found in dsl.asindices()
+    first_rank = np.full(h * w, h * w, dtype=np.intp)
+    np.minimum.at(first_rank, roots, get_asindices_rank((h, w))[pixels])
+    order = np.argsort(first_rank[roots], kind="stable")
+
+    pixels, roots = pixels[order], roots[order]
+    splits = np.nonzero(np.diff(roots))[0] + 1
+
+    colours = flat[pixels].tolist()
+    coords = list(zip((pixels // w).tolist(), (pixels % w).tolist()))
+
+    result = []
+    for start, end in zip([0] + splits.tolist(), splits.tolist() + [len(pixels)]):
+        result.append((colours[start:end], coords[start:end]))
     return result
 
 
+def grid_to_array(grid: Grid):
+    return np.array([list(row) for row in grid], dtype=np.int16)
+
+
+# the same grids are labelled for each abstraction (see create_all()), so keep the results.
+# (shape, grid bytes, univalued, diagonal, bg_colour) -> label_components()
+labelling_cache = {}
+LABELLING_CACHE_SIZE = 1024
+
+
+def get_labelling(grid: Grid, univalued: bool, diagonal: bool, bg_colour: int):
+    """ cached label_components().  The result is shared, do not modify. """
+    values = grid_to_array(grid)
+
+    # univalued objects are a single colour, so can label with no background, and filter out
+    # the background objects after.  Hence all the scg variants share the same labelling.
+    label_bg_colour = -1 if univalued else bg_colour
+
+    key = values.shape, values.tobytes(), univalued, diagonal, label_bg_colour
+    if key not in labelling_cache:
+        if len(labelling_cache) >= LABELLING_CACHE_SIZE:
+            labelling_cache.clear()
+        labelling_cache[key] = label_components(values, univalued, diagonal, label_bg_colour)
+
+    objs = labelling_cache[key]
+    if label_bg_colour != bg_colour:
+        objs = [(colours, coords) for colours, coords in objs if colours[0] != bg_colour]
+    return objs
+
+
+def connected_objects(grid: Grid, univalued: bool, diagonal: bool, bg_colour: int):
+    """
+    same as connected_objects_dsl(), returns list of sets of (colour, coord), but uses numpy
+    labelling
+    """
+    objs = get_labelling(grid, univalued, diagonal, bg_colour)
+    return [set(zip(colours, coords)) for colours, coords in objs]
+
+
+def connected_objects_uni(grid: Grid, do_diagonals: bool, bg_colour: int):
+    """ returns list of (colour, coords) """
+    objs = get_labelling(grid, True, do_diagonals, bg_colour)
+    return [(colours[0], coords[:]) for colours, coords in objs]
+
+
 ###############################################################################
+# is_connected_horizontal() and is_connected_vertical() are the original pair by pair edge checks.
+# They are no longer used to build the edges (see sweep_edges()), but kept as the reference
+# implementation for testing.
 
 def is_connected_horizontal(grid, obj0, obj1, bg_colour):
     height, width = grid.shape
@@ -148,20 +255,91 @@ def is_connected_vertical(grid, obj0, obj1, bg_colour):
     return False
 
 
+def sweep_line(cells, owners):
+    """
+    cells is a sequence of (coord, blocking), where blocking is the pixel not being background.
+    Two objects are connected if there is only background between them, ie no blocking pixels.
+    returns set of pairs (as frozensets) of connected object indices.
+    """
+    pairs = set()
+
+    # objects seen since (and including) the last blocking pixel
+    window = set()
+    for coord, blocking in cells:
+        cell_owners = owners.get(coord)
+        if cell_owners:
+            window = window | cell_owners
+            for index in cell_owners:
+                for other in window:
+                    if other != index:
+                        pairs.add(frozenset((index, other)))
+
+            if blocking:
+                window = cell_owners
+
+        elif blocking:
+            window = set()
+
+    return pairs
+
+
+def sweep_edges(ga, rows, cols):
+    """
+    does a single sweep per row (horizontal) and per column (vertical) of the reconstructed grid,
+    returning which objects are connected on each.  Same as is_connected_horizontal() and
+    is_connected_vertical() on every pair of objects, but O(height x width).
+
+    returns (horizontal, vertical), which are dicts of row/column -> set of pairs of indices.
+    """
+    owners = ga.pixel_owners()
+    blocking = (ga.get_raster() != ga.background_colour).tolist()
+
+    horizontal = {}
+    for i in rows:
+        horizontal[i] = sweep_line((((i, j), blocking[i][j]) for j in range(ga.width)), owners)
+
+    vertical = {}
+    for j in cols:
+        vertical[j] = sweep_line((((i, j), blocking[i][j]) for i in range(ga.height)), owners)
+
+    return horizontal, vertical
+
+
+def edges_from_sweeps(ga, horizontal, vertical):
+    """ combine the results of sweep_edges() into {index: [(other_index, attribute), ...]} """
+    connected = {}
+    for pairs in horizontal.values():
+        for pair in pairs:
+            connected[pair] = HORIZONTAL
+
+    for pairs in vertical.values():
+        for pair in pairs:
+            connected[pair] = VERTICAL if connected.get(pair, VERTICAL) == VERTICAL else BOTH
+
+    edges_by_index = {index: [] for index in ga.indices()}
+    for pair, attribute in connected.items():
+        index0, index1 = pair
+        edges_by_index[index0].append((index1, attribute))
+        edges_by_index[index1].append((index0, attribute))
+
+    # edges are ordered as the objects are
+    position = {index: ii for ii, index in enumerate(edges_by_index)}
+    for edges in edges_by_index.values():
+        edges.sort(key=lambda edge: position[edge[0]])
+
+    return edges_by_index
+
+
 class Builder:
     def __init__(self, ga):
         self.ga = ga
         self.obj_count = Counter()
 
-        # optimisation for add_edge()
-        self.cached_grid = None
-
     def add(self, colour, coords):
         # a unique identifier for object, this is what it was for nx (colour, counter)
         index = (colour, self.obj_count[colour])
         self.obj_count[colour] += 1
         self.ga.add_object(index, ArcObject(index, coords, colour))
-        self.cached_grid = None
 
     def add_multi(self, colour_coords):
         # a unique identifier for object, this is what it was for nx (size, counter)
@@ -169,27 +347,6 @@ class Builder:
         index = (ll, self.obj_count[ll])
         self.obj_count[ll] += 1
         self.ga.add_object(index, ArcMultiObject(index, colour_coords))
-        self.cached_grid = None
-
-    def add_edge(self, obj0, obj1, bg_colour):
-        if self.cached_grid is None:
-            self.cached_grid = self.ga.undo_abstraction()
-
-        horizontal = is_connected_horizontal(self.cached_grid, obj0, obj1, bg_colour)
-        vertical = is_connected_vertical(self.cached_grid, obj0, obj1, bg_colour)
-        if horizontal and vertical:
-            obj0.add_edge(obj1, BOTH)
-            obj1.add_edge(obj0, BOTH)
-        elif horizontal:
-            obj0.add_edge(obj1, HORIZONTAL)
-            obj1.add_edge(obj0, HORIZONTAL)
-        elif vertical:
-            obj0.add_edge(obj1, VERTICAL)
-            obj1.add_edge(obj0, VERTICAL)
-
-    def add_edges(self):
-        for obj0, obj1 in combinations(self.ga.objs, 2):
-            self.add_edge(obj0, obj1, self.ga.background_colour)
 
 
 class AbstractionFactory:
@@ -470,8 +627,8 @@ class AbstractionFactory:
 
         meth = self.mapping[abstraction_name]
 
-        builder = meth(ga)
-        builder.add_edges()
+        # the edges are computed when first used (see GraphAbstraction.sync_edges())
+        meth(ga)
 
         return ga
 
@@ -483,7 +640,8 @@ class AbstractionFactory:
         # keep track of existing bundles to check for duplication - because some of the abstractions
         # can produce the same graphs (or set of objects).
 
-        # XXX we only check if the coords are same, and not other attributes
+        # input bundle fingerprint -> abstraction (see GraphAbstraction.fingerprint())
+        abstraction_by_fingerprint = {}
         bundles_by_abstraction = {}
 
         for abstraction in abstraction_names:
@@ -505,47 +663,22 @@ class AbstractionFactory:
             # skip abstraction if it result in the same bundle as a previous abstraction,
             # for example: nbccg and ccgbr result in the same graphs if there is no enclosed black pixels.
 
-            # this goes through all the graph abstractions and creates a set of frozensets of the
-            # coords (for comparison)
-
-            # XXX and even then, this isnt a fair comparison - there are other things to check like
-            # colours, multi instance etc we should just have an equals method on the GA
-
             # XXX also note we are only testing the input bundle, the output may be different (leaving
             # this for now since output could have different dimensions and be of completely different
             # type of abstraction from input)
             input_bundle = in_train_bundle + in_test_bundle
-            frozen = input_bundle.as_frozen_sets()
+            fingerprint = input_bundle.fingerprint()
 
-            # should we ignore this abstraction ?
-            skip_this_abstraction = False
-
-            # we go through the existing input bundles
-            for task_bundle in bundles_by_abstraction.values():
-
-                assert task_bundle.abstraction != abstraction
-                other_in_bundle = task_bundle.input_bundle()
-                other_frozen = other_in_bundle.as_frozen_sets()
-                assert len(frozen) == len(other_frozen)
-
-                all_is_equal = True
-                for x, y in zip(frozen, other_frozen):
-                    # XXX does this actually work?  How does ordering work in the lists?
-                    if x != y:
-                        all_is_equal = False
-                        break
-
-                if all_is_equal:
-                    log(f"Skipping abstraction {abstraction} as it is the same as abstraction {task_bundle.abstraction}")
-                    skip_this_abstraction = True
-                    break
+            if fingerprint in abstraction_by_fingerprint:
+                log(f"Skipping abstraction {abstraction} as it is the same as abstraction "
+                    f"{abstraction_by_fingerprint[fingerprint]}")
+                continue
 
-            # only add if we dont skip
-            if not skip_this_abstraction:
-                bundles_by_abstraction[abstraction] = TaskGraphBundle(abstraction,
-                                                                      in_train_bundle,
-                                                                      in_test_bundle,
-                                                                      out_bundle)
+            abstraction_by_fingerprint[fingerprint] = abstraction
+            bundles_by_abstraction[abstraction] = TaskGraphBundle(abstraction,
+                                                                  in_train_bundle,
+                                                                  in_test_bundle,
+                                                                  out_bundle)
 
         return bundles_by_abstraction
 
@@ -559,9 +692,15 @@ class GraphBundle:
     def copy(self):
         return GraphBundle(g.copy() for g in self.graphs)
 
+    def snapshot(self):
+        return GraphBundle(g.snapshot() for g in self.graphs)
+
     def as_frozen_sets(self):
         return [ga.all_cords_as_frozen_sets() for ga in self.graphs]
 
+    def fingerprint(self):
+        return tuple(ga.fingerprint() for ga in self.graphs)
+
     def static_object_attributes(self, f):
         """
         Apply function f to each object across all graphs
@@ -0,0 +1,305 @@
+'''
+Run the search over many tasks, each in its own process.
+
+Tasks are started as slots become free (so long tasks do not hold up the rest).  Each task has a
+hard time limit (on top of the search's own time_limit) and a share of the memory budget, and
+runs in its own process, so one task crashing cannot take down the batch.  Results are written
+as they finish, one json object per line:
+
+  {"task_id": ..., "solved": ..., "status": ..., "time": ..., "playouts": ..., "best_score": ...,
+   "error": ..., "exitcode": ...}
+
+Every line has all the fields (None if not known for that task).  solved is whether the test
+predictions are correct (None if the test outputs are not known).
+
+Alternatively BudgetScheduler shares one overall time budget between all the tasks (in this
+process).  Each task is searched for an initial slice, and the left over time (from tasks that
+were solved quickly) goes to the tasks whose best score is still improving.
+
+usage: python -m mcarga.batch --workers 16 --time-limit 300 --output results.jsonl [task_id ...]
+       python -m mcarga.batch --total-time 3600 --output results.jsonl [task_id ...]
+'''
+
+import sys
+import json
+import time
+import argparse
+import traceback
+import multiprocessing
+
+from mcarga.core.alogger import log
+from mcarga.search.mcts import SearchEngine, SearchStatus, Config
+
+
+RESULT_FIELDS = ("task_id", "solved", "status", "time", "playouts", "best_score", "error", "exitcode")
+
+
+def result_row(task_id, status, **fields):
+    """ returns result dict with all of RESULT_FIELDS, those not given are None (solved is False) """
+    assert all(name in RESULT_FIELDS for name in fields), fields
+    result = dict.fromkeys(RESULT_FIELDS)
+    result.update(task_id=task_id, solved=False, status=status)
+    result.update(fields)
+    return result
+
+
+def run_task(task, config):
+    """ returns result dict for the task """
+    engine = SearchEngine(task, config)
+    engine.solve()
+    return task_result(engine)
+
+
+def task_result(engine):
+    task = engine.task
+    status = engine.status.name if engine.status is not None else "NotRun"
+
+    if not engine.all_anodes:
+        # timed out before any abstraction had a root node, so there is nothing to apply
+        return result_row(task.task_id, status, time=round(engine.time_used, 2),
+                          playouts=engine.tree_playouts)
+
+    anode, instructions = engine.get_best_instructions()
+
+    solved = None
+    if all(sample.out_grid is not None for sample in task.test_samples):
+        solved = True
+        for sample in task.test_samples:
+            prediction = engine.apply_solution(sample.in_grid, anode, instructions)
+            if prediction is None or not (prediction == sample.out_grid):
+                solved = False
+
+    return result_row(task.task_id, status,
+                      solved=solved,
+                      time=round(engine.time_used, 2),
+                      playouts=engine.tree_playouts,
+                      best_score=anode.best_score)
+
+
+def task_worker(task, config, memory_limit, conn):
+    """ runs in child process, sends back the result dict """
+    if memory_limit:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    try:
+        result = run_task(task, config)
+
+    except BaseException as exc:
+        traceback.print_exc()
+        result = result_row(task.task_id, "Error", error=repr(exc))
+
+    conn.send(result)
+    conn.close()
+
+
+class RunningTask:
+    def __init__(self, task, process, conn, start_time):
+        self.task = task
+        self.process = process
+        self.conn = conn
+        self.start_time = start_time
+
+
+class BatchRunner:
+    def __init__(self, tasks, config, output_path, workers=1, memory_budget=None, grace_time=30):
+        """
+        memory_budget (bytes) is shared equally between the workers.  Tasks are killed if they run
+        grace_time seconds past config.time_limit.
+        """
+        self.tasks = list(tasks)
+        self.config = config
+        self.output_path = output_path
+        self.workers = workers
+        self.memory_limit = memory_budget // workers if memory_budget else None
+        self.grace_time = grace_time
+
+        self.results = []
+
+    def run(self):
+        todo = list(self.tasks)
+        running = []
+
+        with open(self.output_path, "a") as output:
+            while todo or running:
+                while todo and len(running) < self.workers:
+                    running.append(self.start(todo.pop(0)))
+
+                still_running = []
+                for rt in running:
+                    result = self.check(rt)
+                    if result is None:
+                        still_running.append(rt)
+                        continue
+
+                    self.results.append(result)
+                    output.write(json.dumps(result) + "\n")
+                    output.flush()
+                    print(f"batch: {result}")
+
+                running = still_running
+                time.sleep(0.1)
+
+        return self.results
+
+    def start(self, task):
+        parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=task_worker,
+                                          args=(task, self.config, self.memory_limit, child_conn))
+        process.start()
+        child_conn.close()
+        return RunningTask(task, process, parent_conn, time.time())
+
+    def check(self, rt):
+        """ returns result dict if task has finished (or crashed/killed), otherwise None """
+        elapsed = time.time() - rt.start_time
+
+        if rt.conn.poll():
+            try:
+                result = rt.conn.recv()
+            except EOFError:
+                result = None
+
+            rt.process.join()
+            if result is not None:
+                return result
+
+        elif rt.process.is_alive():
+            if elapsed < self.config.time_limit + self.grace_time:
+                return None
+
+            rt.process.kill()
+            rt.process.join()
+            return result_row(rt.task.task_id, "Killed", time=round(elapsed, 2))
+
+        else:
+            rt.process.join()
+
+        return result_row(rt.task.task_id, "Crashed", time=round(elapsed, 2),
+                          exitcode=rt.process.exitcode)
+
+
+class BudgetScheduler:
+    def __init__(self, tasks, config, output_path, total_time, initial_fraction=0.5, min_slice=5):
+        """
+        total_time (seconds) is shared between all the tasks.  initial_fraction of it is split
+        equally as the initial slice for each task, the rest is handed out in rounds of at least
+        min_slice seconds.  config.time_limit is ignored.
+        """
+        self.tasks = list(tasks)
+        self.config = config
+        self.output_path = output_path
+        self.total_time = total_time
+        self.initial_fraction = initial_fraction
+        self.min_slice = min_slice
+
+        self.engines = [SearchEngine(task, config) for task in self.tasks]
+
+        # engine -> best score at the end of its previous slices
+        self.score_history = {engine: [] for engine in self.engines}
+
+        # engine -> exception, engines are not run again after raising
+        self.errors = {}
+
+        self.results = []
+
+    def time_left(self):
+        return self.deadline - time.time()
+
+    def run_slice(self, engine, time_slice):
+        try:
+            engine.run(min(time_slice, max(0, self.time_left())))
+
+        except Exception as exc:
+            traceback.print_exc()
+            self.errors[engine] = repr(exc)
+
+        self.score_history[engine].append(engine.best_score())
+
+    def is_active(self, engine):
+        return engine.status != SearchStatus.SolutionFound and engine not in self.errors
+
+    def is_improving(self, engine):
+        history = self.score_history[engine]
+        if len(history) < 2 or history[-2] is None or engine.status == SearchStatus.TimeoutInitialiseRoot:
+            return True
+        return history[-1] < history[-2]
+
+    def run(self):
+        self.deadline = time.time() + self.total_time
+
+        initial_slice = max(self.min_slice,
+                            self.total_time * self.initial_fraction / max(1, len(self.engines)))
+        for engine in self.engines:
+            if self.time_left() <= 0:
+                break
+            self.run_slice(engine, initial_slice)
+
+        while self.time_left() > 0:
+            active = [e for e in self.engines if self.is_active(e)]
+            if not active:
+                break
+
+            # prefer those still improving, otherwise share between all that are not solved
+            improving = [e for e in active if self.is_improving(e)]
+            candidates = improving or active
+
+            # in rounds no longer than the initial slice, so we keep checking who is improving
+            time_slice = max(self.min_slice, min(initial_slice, self.time_left() / len(candidates)))
+            log(f"budget: {self.time_left():.1f}s left, {len(improving)} improving, " +
+                f"{len(active)} active, slice: {time_slice:.1f}s")
+
+            for engine in candidates:
+                if self.time_left() <= 0:
+                    break
+                self.run_slice(engine, time_slice)
+
+        with open(self.output_path, "a") as output:
+            for engine in self.engines:
+                if engine in self.errors:
+                    result = result_row(engine.task.task_id, "Error", error=self.errors[engine],
+                                        playouts=engine.tree_playouts)
+                elif engine.best_score() is None:
+                    result = result_row(engine.task.task_id, "NotRun")
+                else:
+                    result = task_result(engine)
+
+                self.results.append(result)
+                output.write(json.dumps(result) + "\n")
+                print(f"batch: {result}")
+
+        return self.results
+
+
+def main():
+    from competition import loader
+
+    parser = argparse.ArgumentParser(description="run McARGA over many tasks")
+    parser.add_argument("task_ids", nargs="*", help="default is all tasks")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--time-limit", type=int, default=300, help="per task, in seconds")
+    parser.add_argument("--memory-gb", type=float, default=None, help="shared by all workers")
+    parser.add_argument("--total-time", type=int, default=None,
+                        help="share this time budget (seconds) between all tasks, in this process")
+    parser.add_argument("--output", default="results.jsonl")
+    args = parser.parse_args()
+
+    tasks = loader.get_kaggle_data(loader.WhichData.TRAIN, on_kaggle=False)
+    if args.task_ids:
+        tasks = [loader.filter_tasks(tasks, task_id)[0] for task_id in args.task_ids]
+
+    config = Config(time_limit=args.time_limit, verbose_logging=False)
+    memory_budget = int(args.memory_gb * 1024 ** 3) if args.memory_gb else None
+
+    if args.total_time:
+        runner = BudgetScheduler(tasks, config, args.output, args.total_time)
+    else:
+        runner = BatchRunner(tasks, config, args.output, workers=args.workers, memory_budget=memory_budget)
+    results = runner.run()
+
+    solved = sum(1 for r in results if r.get("solved"))
+    print(f"solved {solved} / {len(results)}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -18,11 +18,8 @@ def convert_to_nx(ga):
             assert isinstance(arc_obj, ArcMultiObject)
             g.add_node(node, coords=arc_obj.coords, colour=arc_obj.most_common_colour, size=arc_obj.size)
 
-        for edge in arc_obj.edges:
-            other, attribute = edge
-            # Find the key for 'other' in ga
-            other_key = next(key for key, value in ga.items() if value == other)
-            g.add_edge(node, other_key, direction=attribute)
+        for other, attribute in ga.get_edges(node):
+            g.add_edge(node, other.index, direction=attribute)
 
     return g
 
@@ -23,6 +23,13 @@ class FilterInstructions:
                 assert isinstance(fi, FilterInstructions)
                 self.list_of_fi += fi.list_of_fi
 
+        # set by filters.compile_filters()
+        self.compiled = None
+
+        # set by filters.get_candidate_filters(), the objects selected in the bundle the filters
+        # were generated from (see filters.filter_masks())
+        self.masks = None
+
     def __iter__(self):
         return iter(self.list_of_fi)
 
@@ -68,6 +75,15 @@ class Instruction:
             assert isinstance(pbi, ParamBindingInstruction)
         self.param_binding_instruction = pbi
 
+        # set by parameters.compile_instruction()
+        self.plan = None
+
+    def __getstate__(self):
+        # the plan is recompiled on demand (ie not sent to worker processes)
+        state = self.__dict__.copy()
+        state["plan"] = None
+        return state
+
     def is_param_binding_set(self):
         return self.param_binding_instruction is not None
 
@@ -2,7 +2,8 @@ from mcarga.core.definitions import Direction, RelativePosition
 
 from mcarga.gen_values import PossibleValuesDynamicParams, ParamBindingArg
 from mcarga.instruction import ParamBindingInstruction
-from mcarga.selection.filters import Filters, apply_filters
+from mcarga.selection import config as filter_config
+from mcarga.selection.filters import Filters, compile_filters, filter_indices
 from mcarga.transformations.transformations import Transformations
 
 
@@ -17,9 +18,8 @@ class ParameterBinding:
         """
         returns the first neighbour of an object satisfying given colour filter
         """
-        obj = self.ga.get_obj(index)
         unique = None
-        for neighbour in obj.neighbours():
+        for neighbour in self.ga.neighbours(index):
             if self.the_filterer.by_colour(neighbour.index, colour, exclude=False):
                 if unique is not None:
                     return None
@@ -30,9 +30,8 @@ class ParameterBinding:
         """
         returns the first neighbour of an object satisfying given size filter
         """
-        obj = self.ga.get_obj(index)
         unique = None
-        for neighbour in obj.neighbours():
+        for neighbour in self.ga.neighbours(index):
             if self.the_filterer.by_size(neighbour.index, size, exclude=False):
                 if unique is not None:
                     return None
@@ -47,12 +46,7 @@ def generate_dynamic_params(fis, input_bundle):
     filtered_objects_per_graph = []
     for ga in input_bundle:
 
-        filtered_objects = []
-
-        # for each object
-        for index in ga.indices():
-            if apply_filters(fis, ga, index):
-                filtered_objects.append(index)
+        filtered_objects = filter_indices(fis, ga)
 
         if not filtered_objects:
             return []
@@ -123,62 +117,91 @@ def generate_dynamic_params(fis, input_bundle):
 def apply_instruction(ga, ii):
     ''' returns False if no transformation applied. otherwise returns True.
      !! WILL MODIFY ga !!! '''
-    VERBOSE = False
-
-    if VERBOSE:
-        print(f"IN: {ga}")
-        print(f"IN: {ii}")
-
-    tt = Transformations(ga)
-    func = getattr(tt, ii.ti.name)
+    return compile_instruction(ii)(ga)
+
+
+def compile_instruction(ii):
+    ''' returns the InstructionPlan for instruction, cached on the instruction '''
+    if ii.plan is None:
+        ii.plan = InstructionPlan(ii)
+    return ii.plan
+
+
+class InstructionPlan:
+    '''
+    an instruction with the filter and transformation functions (and parameter binding function)
+    looked up once, so it can be applied to many graphs cheaply.  Call with the graph to apply to.
+    '''
+
+    def __init__(self, ii):
+        self.instruction = ii
+
+        self.fis = ii.fis
+        compile_filters(self.fis)
+        self.transformation = getattr(Transformations, ii.ti.name)
+        self.params = ii.ti.params
+
+        self.pbi = ii.param_binding_instruction
+        if self.pbi is None:
+            # this cannot be set if instruction is not set
+            assert not ii.ti.has_param_binding()
+            self.param_binding = None
+            self.bound_params = None
+        else:
+            # this cannot be set if instruction is not set
+            assert ii.ti.has_param_binding()
+            assert isinstance(self.pbi, ParamBindingInstruction)
+            self.param_binding = getattr(ParameterBinding, self.pbi.name)
+            self.bound_params = [k for k, v in self.params.items() if isinstance(v, ParamBindingArg)]
+
+        # all the parameter bindings are by neighbour
+        self.uses_edges = (self.param_binding is not None or
+                           any(fi.name in filter_config.neighbour_filter_ops for fi in self.fis))
+
+    def __call__(self, ga):
+        ''' returns False if no transformation applied. otherwise returns True.
+         !! WILL MODIFY ga !!! '''
+        VERBOSE = False
+
+        # the previous instruction's changes, so filters and transformations do not see this one's
+        ga.commit()
+        if self.uses_edges:
+            ga.sync_edges()
 
-    def func_wrapper(index, **kwds):
-        params_str = ", ".join(f"{k}={v}" for k, v in kwds.items())
         if VERBOSE:
-            print(f"CALLING {ii.ti.name}({index} {params_str})")
-        return func(index, **kwds)
-
-    # for each object
-    filtered_objs = [index for index in ga.indices() if apply_filters(ii.fis, ga, index)]
-    if VERBOSE:
-        print(f"filtered_objs {filtered_objs}")
+            print(f"IN: {ga}")
+            print(f"IN: {self.instruction}")
 
-    if not ii.is_param_binding_set():
-        # note func_wrapper() is mainly for side effects in transforming ga.
+        tt = Transformations(ga)
+        func = self.transformation
 
-        # this cannot be set if instruction is not set
-        assert not ii.ti.has_param_binding()
-
-        changed = False
-        for index in filtered_objs:
-            if func_wrapper(index, **ii.ti.params):
-                changed = True
-
-        if not changed:
-            return False
-
-    else:
-        # this cannot be set if instruction is not set
-        assert ii.ti.has_param_binding()
-        assert isinstance(ii.param_binding_instruction, ParamBindingInstruction)
-
-        pbi = ii.param_binding_instruction
+        # for each object
+        filtered_objs = filter_indices(self.fis, ga)
+        if VERBOSE:
+            print(f"filtered_objs {filtered_objs}")
 
-        for index in filtered_objs:
-            call_with_params = {}
+        if self.param_binding is None:
+            # note func() is mainly for side effects in transforming ga.
+            changed = False
+            for index in filtered_objs:
+                if func(tt, index, **self.params):
+                    changed = True
 
-            for k, v in ii.ti.params.items():
-                if isinstance(v, ParamBindingArg):
-                    v = bind_parameters(index, ga, pbi, k)
+            if not changed:
+                return False
 
-                call_with_params[k] = v
+        else:
+            pb = ParameterBinding(ga)
+            for index in filtered_objs:
+                call_with_params = dict(self.params)
+                for k in self.bound_params:
+                    call_with_params[k] = bind_parameters(index, ga, self.pbi, k, pb=pb)
 
-            func_wrapper(index, **call_with_params)
+                func(tt, index, **call_with_params)
 
-    # update the edges in the abstracted graph to reflect the changes
-    ga.update_abstracted_graph()
-    ga.fix_up_attrs()
-    return True
+        # the edges and colours are updated when next needed (often never, if only scored)
+        ga.defer_commit()
+        return True
 
 
 def get_relative_pos(ga, index0, index1):
@@ -245,11 +268,11 @@ def get_centroid(obj):
     return get_centroid_from_coords(obj.coords)
 
 
-def get_mirror_axis(obj0, obj1):
+def get_mirror_axis(ga, obj0, obj1):
     """get the axis to mirror obj0 with given obj1
     """
     obj1_centroid = get_centroid(obj1)
-    edge = obj0.has_edge(obj1)
+    edge = ga.has_edge(obj0.index, obj1.index)
     if edge == "vertical" or edge == "both":
         return (obj1_centroid[0], None)
     else:
@@ -276,10 +299,11 @@ if 0:
             return (y, x)
 
 
-def bind_parameters(index, ga, pbi, ti_param_name):
+def bind_parameters(index, ga, pbi, ti_param_name, pb=None):
     VERBOSE = False
     assert isinstance(pbi, ParamBindingInstruction)
-    pb = ParameterBinding(ga)
+    if pb is None:
+        pb = ParameterBinding(ga)
     func = getattr(pb, pbi.name)
     target_index = func(index, **pbi.params)
 
@@ -294,6 +318,9 @@ def bind_parameters(index, ga, pbi, ti_param_name):
     if ti_param_name in ("colour", "line_colour"):
         obj = ga.get_obj(target_index)
         target_colour = obj.colour
+
+        # ArcMultiObject colour is -1, which is not a colour
+        assert target_colour >= 0, f"cannot bind {ti_param_name} to colour of {obj}"
         return target_colour
 
     elif ti_param_name == "direction":
@@ -306,7 +333,7 @@ def bind_parameters(index, ga, pbi, ti_param_name):
     elif ti_param_name == "mirror_axis":
         obj0 = ga.get_obj(index)
         obj1 = ga.get_obj(target_index)
-        target_axis = get_mirror_axis(obj0, obj1)
+        target_axis = get_mirror_axis(ga, obj0, obj1)
         return target_axis
 
     elif ti_param_name == "point":
@@ -1,6 +1,7 @@
 import sys
 import math
 import time
+import heapq
 import traceback
 from typing import List
 from collections import deque
@@ -20,6 +21,7 @@ from mcarga import parameters
 from mcarga.transformations import transformations as trans
 from mcarga.instruction import Instruction
 from mcarga.search.mcts_scoring import Scoring, ScoringFunction
+from mcarga.search.parallel import ParallelExpander, RootParallelSearch
 
 
 @dataclass
@@ -46,6 +48,30 @@ class Config:
 
     expand_children_max: int = 500
 
+    # progressive widening: a node is only expanded until it has
+    # progressive_widening_constant * visits ** progressive_widening_alpha children (0 is off, ie
+    # expand up to expand_children_max instructions every visit until all are expanded)
+    progressive_widening_constant: float = 20
+    progressive_widening_alpha: float = 0.5
+
+    # expand instructions whose filters select pixels that differ from the target first (see
+    # SearchEngine.prioritise_filters()).  Widening only pays off with this on, so the first
+    # children of a node are the likely ones.
+    prioritise_instructions: bool = True
+
+    # number of children created and then scored together (see Scoring.score_batch())
+    expand_batch_size: int = 32
+
+    # parallel child expansion, number of worker processes (0 is off) and number of instructions
+    # sent to a worker at a time.  See search/parallel.py
+    expand_workers: int = 0
+    expand_chunk_size: int = 16
+
+    # root parallel search, number of worker processes each searching one abstraction (0 is off),
+    # and how often (seconds) they report back.  See search/parallel.py
+    root_parallel_workers: int = 0
+    root_parallel_sync_interval: float = 1.0
+
     # this makes testing easier
     do_combined_filters: bool = False
 
@@ -80,6 +106,9 @@ class AbstractionNode:
         self.root_node = None
         self.seen_tokens = set()
 
+        # set by Scoring.get_targets()
+        self.scoring_targets = None
+
         self.visits = 0
         self.stats = Stats()
 
@@ -90,9 +119,9 @@ class AbstractionNode:
         self.seen_tokens.add(token)
 
     def orig_input_bundle(self):
-        ' return a copy of input bundle '
-        in_train_bundle = self.task_bundle.in_train_bundle.copy()
-        in_test_bundle = self.task_bundle.in_test_bundle.copy()
+        ' return a (copy-on-write) copy of input bundle '
+        in_train_bundle = self.task_bundle.in_train_bundle.snapshot()
+        in_test_bundle = self.task_bundle.in_test_bundle.snapshot()
         for g in in_train_bundle:
             g.is_training_graph = True
 
@@ -105,6 +134,42 @@ class AbstractionNode:
     def best_score(self):
         return self.root_node.best_score
 
+    def best_path(self):
+        """
+        a copy with just the path of lowest scoring children (ie what get_best_instructions()
+        follows), no seen tokens and no task bundle.  Used to send back the result of a root
+        parallel worker, rather than the whole search tree.
+        """
+        anode = AbstractionNode(self.task_bundle)
+        anode.task_bundle = None
+        anode.visits = self.visits
+        anode.stats = self.stats
+
+        cur = self.root_node
+        parent = anode
+        while cur is not None:
+            node = SearchTreeNode(parent, cur.original_score)
+            node.best_score = cur.best_score
+            node.visits = cur.visits
+            if parent is anode:
+                anode.root_node = node
+            else:
+                parent.next = node
+
+            best_child = None
+            for c in cur.children:
+                if best_child is None or c.score < best_child.score:
+                    best_child = c
+
+            if best_child is None:
+                break
+
+            parent = SearchNodeChild(best_child.instruction, node, best_child.score, best_child.token)
+            node.add(parent)
+            cur = best_child.next
+
+        return anode
+
 
 class SearchNodeChild:
     # these are set are start from config
@@ -114,6 +179,11 @@ class SearchNodeChild:
     def __init__(self, instruction, parent, score, token):
         self.instruction = instruction
         self.search_tree_node = parent
+
+        # set by SearchTreeNode.add(), order added and whether in parent's children (not pruned)
+        self.seq = None
+        self.active = False
+
         self.score = score
 
         # ability to lookup later
@@ -124,8 +194,15 @@ class SearchNodeChild:
 
         self.visits = self.INITIAL_VISITS_CONSTANT
 
+    def update_score(self, score):
+        self.score = score
+        if self.active:
+            self.search_tree_node.child_changed(self)
+
     def incr_visits(self):
         self.visits += 1
+        if self.active:
+            self.search_tree_node.child_changed(self)
 
     def normalise_score(self, node_score):
         return 1.0 - self.score / node_score
@@ -137,6 +214,54 @@ class SearchNodeChild:
         return self.normalise_score(node_score) + self.exploration_bonus(parent_visits)
 
 
+class InstructionQueue:
+    """
+    instructions still to be expanded for a node.  These are generated lazily (see
+    SearchEngine.generate_instructions()), so only as many as are expanded are ever created.
+    Instructions that were taken but not expanded can be put back, and are returned first.
+    """
+
+    def __init__(self, generator=None):
+        self.generator = generator
+        self.put_back = deque()
+
+        # number of instructions generated so far
+        self.generated = 0
+
+    def __getstate__(self):
+        # generators can't be pickled.  Only the instructions already generated survive pickling
+        # (which is fine for returning search trees from root parallel workers, see parallel.py)
+        state = self.__dict__.copy()
+        state["generator"] = None
+        return state
+
+    def __bool__(self):
+        return self.peek() is not None
+
+    def peek(self):
+        if not self.put_back and self.generator is not None:
+            instr = next(self.generator, None)
+            if instr is None:
+                # exhausted, let go of the generator (and the bundle it holds)
+                self.generator = None
+            else:
+                self.generated += 1
+                self.put_back.append(instr)
+
+        return self.put_back[0] if self.put_back else None
+
+    def take(self, count):
+        """ returns up to count instructions """
+        instructions = []
+        while len(instructions) < count and self.peek() is not None:
+            instructions.append(self.put_back.popleft())
+        return instructions
+
+    def extendleft(self, instructions):
+        """ put back instructions, in order, in front of the queue """
+        self.put_back.extendleft(reversed(instructions))
+
+
 class SearchTreeNode:
     def __init__(self, back_link, original_score):
         # can be one of SearchNodeChild or AbstractionNode (the later terminating back prop)
@@ -148,14 +273,19 @@ class SearchTreeNode:
         self.pruned = []
         self.visits = 1
 
+        # visits -> heap of (score, seq, child), see update()
+        self.visit_groups = {}
+        self.group_entries = 0
+        self.next_seq = 0
+
         # set later - stats:
         self.total_filter_instructions = 0
         self.total_instructions = 0
 
-        self.todo_instructions = deque()
+        self.todo_instructions = InstructionQueue()
 
     def finished_expanding(self):
-        if len(self.todo_instructions) == 0:
+        if not self.todo_instructions:
             return True
 
         if self.best_score == 0:
@@ -167,19 +297,78 @@ class SearchTreeNode:
         self.visits += 1
 
     def update(self):
+        """
+        updates best_score to the lowest scoring child, and returns the child with the best uct
+        score (None if no children).
+
+        Children with the same number of visits have the same exploration bonus, so the best uct
+        child is the lowest scoring child of one of the visit_groups.  Hence only one child per
+        group needs its uct score calculated (and there are few distinct visit counts).
+        """
         if not self.children:
-            return
+            return None
 
-        # this is rough for performance!
-        self.children.sort(key=lambda x: x.score)
+        log_term = math.log(self.visits + 1)
 
-        # lowest score
-        self.best_score = self.children[0].score
+        best_child = None
+        best_uct = None
+        best_score = None
+        for visits in list(self.visit_groups):
+            child = self.best_of_group(visits)
+            if child is None:
+                continue
+
+            if best_score is None or child.score < best_score:
+                best_score = child.score
+
+            uct = child.normalise_score(self.original_score) + child.UCB_CONSTANT * math.sqrt(log_term / visits)
+
+            # ties go to the lower score, then the first added
+            if (best_child is None or uct > best_uct or
+                    (uct == best_uct and (child.score, child.seq) < (best_child.score, best_child.seq))):
+                best_child = child
+                best_uct = uct
+
+        self.best_score = best_score
+        return best_child
 
-        self.children.sort(key=lambda x: x.uct_score(self.original_score, self.visits), reverse=True)
+    def best_of_group(self, visits):
+        """ the lowest scoring child with visits, dropping stale entries """
+        heap = self.visit_groups[visits]
+        while heap:
+            score, _, child = heap[0]
+            if child.active and child.visits == visits and child.score == score:
+                return child
+            heapq.heappop(heap)
+            self.group_entries -= 1
+
+        del self.visit_groups[visits]
+        return None
+
+    def child_changed(self, child):
+        """ called when an active child's score or visits change """
+        heapq.heappush(self.visit_groups.setdefault(child.visits, []), (child.score, child.seq, child))
+        self.group_entries += 1
+
+        # too many stale entries
+        if self.group_entries > 4 * len(self.children) + 64:
+            self.rebuild_groups()
+
+    def rebuild_groups(self):
+        self.visit_groups = {}
+        for child in self.children:
+            self.visit_groups.setdefault(child.visits, []).append((child.score, child.seq, child))
+
+        for heap in self.visit_groups.values():
+            heapq.heapify(heap)
+        self.group_entries = len(self.children)
 
     def add(self, child):
+        child.seq = self.next_seq
+        self.next_seq += 1
+        child.active = True
         self.children.append(child)
+        self.child_changed(child)
 
     def dump(self, max_count, prefix="", only_better_than_orig=False):
 
@@ -218,6 +407,12 @@ class SearchTreeNode:
 
         self.children = keep
         self.pruned = pruned
+        for c in keep:
+            c.active = True
+        for c in pruned:
+            c.active = False
+
+        self.rebuild_groups()
         self.update()
         log(f"Pruned {olen - len(self.children)} children")
 
@@ -235,12 +430,26 @@ class SearchEngine:
         self.config = config
         self.score_ga = Scoring(config)
 
+        # created on demand, see create_children_parallel()
+        self.expander = None
+
+        # search state, see initialise_root() and run()
+        self.abstraction_bundles = None
+        self.all_anodes = []
+        self.worst_original_score = -1
+        self.tree_playouts = 0
+
+        self.status = None
+        self.start_time = time.time()
+        self.deadline = self.start_time + config.time_limit
+        self.time_used = 0.0
+
         SearchNodeChild.UCB_CONSTANT = self.config.child_ucb_constant
         SearchNodeChild.INITIAL_VISITS_CONSTANT = self.config.child_initial_visits_constant
         Logger.VERBOSE = self.config.verbose_logging
 
     def timeout(self):
-        return time.time() > self.start_time + self.config.time_limit
+        return time.time() > self.deadline
 
     def solve(self):
         log(f"Running task.solve() for #{self.task.task_id}")
@@ -250,49 +459,88 @@ class SearchEngine:
 
         log(f"Running task.solve() for #{self.task.task_id}")
 
-        log("---> Initialising root")
-        stop_search = self.initialise_root()
-        log("<--- Done initialising root()")
+        if self.config.root_parallel_workers > 0:
+            self.status = RootParallelSearch(self).solve()
+            self.time_used = time.time() - self.start_time
+            return self.time_used, self.status
 
-        assert isinstance(stop_search, SearchStatus)
-
-        while stop_search == SearchStatus.ContinueRunning:
-            stop_search = self.tree_playout()
-            log(f"stop_search: {stop_search}")
+        stop_search = self.run(self.config.time_limit)
 
         solving_time = time.time() - self.start_time
 
         return solving_time, stop_search
 
+    def run(self, time_slice):
+        """
+        search for up to time_slice seconds.  This can be called again to continue the search
+        from where it left off (all the search state lives on the AbstractionNodes), until it
+        returns SolutionFound.  See BudgetScheduler in batch.py
+        """
+
+        slice_start = time.time()
+        self.deadline = slice_start + time_slice
+
+        try:
+            if self.status in (None, SearchStatus.TimeoutInitialiseRoot):
+                log("---> Initialising root")
+                self.status = self.initialise_root()
+                log("<--- Done initialising root()")
+
+            elif self.status == SearchStatus.NoSolutionFound:
+                # resuming
+                self.status = SearchStatus.ContinueRunning
+
+            assert isinstance(self.status, SearchStatus)
+
+            while self.status == SearchStatus.ContinueRunning:
+                self.status = self.tree_playout()
+                log(f"stop_search: {self.status}")
+
+        finally:
+            if self.expander is not None:
+                self.expander.shutdown()
+                self.expander = None
+
+            self.time_used += time.time() - slice_start
+
+        return self.status
+
+    def best_score(self):
+        """ best score so far over all abstractions, or None if search not started """
+        scores = [anode.best_score for anode in self.all_anodes if anode.root_node is not None]
+        return min(scores) if scores else None
+
     def initialise_root(self):
         """
-        initialises the root node of search tree for each abstraction
+        initialises the root node of search tree for each abstraction.  If this times out, calling
+        it again will continue with the remaining abstractions.
         """
 
-        f = factory.AbstractionFactory()
-        self.abstraction_bundles = f.create_all(self.task, self.config.abstractions)
-        log(f"using abstraction_bundles: {self.abstraction_bundles.keys()}")
+        if self.abstraction_bundles is None:
+            f = factory.AbstractionFactory()
+            self.abstraction_bundles = f.create_all(self.task, self.config.abstractions)
+            log(f"using abstraction_bundles: {self.abstraction_bundles.keys()}")
 
-        self.all_anodes = []
-        self.worst_original_score = -1
-        self.tree_playouts = 0
+        done = set(anode.abstraction for anode in self.all_anodes)
         for abstraction, task_bundle in self.abstraction_bundles.items():
+            if abstraction in done:
+                continue
 
             log(f"Doing abstraction: {abstraction}")
 
             assert task_bundle.abstraction == abstraction
             anode = AbstractionNode(task_bundle)
-            self.all_anodes.append(anode)
 
             s0 = time.time()
 
             in_bundle = anode.orig_input_bundle()
 
-            original_score, _ = self.score_ga(anode, in_bundle.copy())
+            original_score, _ = self.score_ga(anode, in_bundle.snapshot())
             self.worst_original_score = max(original_score, self.worst_original_score)
 
             parent_node = anode
             anode.root_node = self.expand_node(anode, in_bundle, parent_node)
+            self.all_anodes.append(anode)
 
             s1 = time.time()
             log(f"expand_node() time_taken: {s1 - s0:.2f}")
@@ -311,8 +559,7 @@ class SearchEngine:
 
     def select_child(self, node):
         # this does a uct update
-        node.update()
-        return node.children[0]
+        return node.update()
 
     def select_child_visits(self, node):
         best_child = None
@@ -373,9 +620,10 @@ class SearchEngine:
             child.incr_visits()
 
             # move state forward
+            plan = parameters.compile_instruction(child.instruction)
             changed = False
             for ga in in_bundle:
-                if parameters.apply_instruction(ga, child.instruction):
+                if plan(ga):
                     changed = True
             assert changed
 
@@ -423,7 +671,7 @@ class SearchEngine:
         ###############################################################################
         # create a node
 
-        original_score, token = self.score_ga(anode, in_bundle.copy())
+        original_score, token = self.score_ga(anode, in_bundle.snapshot())
         node = SearchTreeNode(parent_node, original_score)
         anode.add_token_to_seen(token)
 
@@ -437,6 +685,9 @@ class SearchEngine:
         s1 = time.time()
         log(f"get_candidate_filters() time_taken: {s1 - s0:.2f}, # {len(filters_instrs)}")
 
+        if self.config.prioritise_instructions:
+            filters_instrs = self.prioritise_filters(anode, filters_instrs, in_bundle)
+
         # stats:
         anode.stats.total_filter_instructions += len(filters_instrs)
         node.total_filter_instructions = len(filters_instrs)
@@ -449,26 +700,14 @@ class SearchEngine:
         s0 = time.time()
         tis = list(trans.get_all_transformations(transformations, in_bundle))
 
-        all_instructions = []
-        for fis in filters_instrs:
-            dyn_params = parameters.generate_dynamic_params(fis, in_bundle)
-            for ti in tis:
-                if ti.has_param_binding():
-                    for pbi in dyn_params:
-                        # only added if both ti.has_param_binding() and dyn_params has values
-                        all_instructions.append(Instruction(fis, ti, pbi))
-                else:
-                    all_instructions.append(Instruction(fis, ti))
-
         s1 = time.time()
-        log(f" {s1 - s0:.2f} secs -- #tis {len(tis)} / *instrs {len(all_instructions)}")
+        log(f" {s1 - s0:.2f} secs -- #tis {len(tis)} / *instrs {len(filters_instrs) * len(tis)}+")
 
         s0 = time.time()
 
-        anode.stats.total_instructions += len(all_instructions)
-        node.total_instructions = len(all_instructions)
-
-        node.todo_instructions.extend(all_instructions)
+        # in_bundle is moved forward after this, so the generator gets its own snapshot
+        generator = self.generate_instructions(anode, node, filters_instrs, tis, in_bundle.snapshot())
+        node.todo_instructions = InstructionQueue(generator)
         if node.todo_instructions:
             self.continue_expand_node(anode, node, in_bundle)
 
@@ -482,53 +721,153 @@ class SearchEngine:
 
         return node
 
+    def prioritise_filters(self, anode, filters_instrs, in_bundle):
+        """
+        a cheap guess at which instructions are worth expanding first: order the filters by the
+        fraction of pixels of the selected objects that differ from the target (most first), then
+        by the number that differ.  Ties keep their original order.
+
+        The selected objects are the masks from get_candidate_filters(), so no filters are run here.
+        """
+
+        # per graph, (#differ, #same) for each object in ga.indices() order (ie by mask bit)
+        object_diffs = []
+        for ga, (out_array, _, _) in zip(in_bundle, self.score_ga.get_targets(anode)):
+            raster = ga.get_raster()
+            if raster.shape != out_array.shape:
+                object_diffs.append(None)
+                continue
+
+            diff = raster != out_array
+            diffs = []
+            for _, obj in ga.items():
+                coords = obj.safe_coords(ga)
+                differ = sum(1 for i, j in coords if diff[i, j])
+                diffs.append((differ, len(coords) - differ))
+            object_diffs.append(diffs)
+
+        def key(fis):
+            masks = fis.masks
+            if masks is None:
+                masks = filters.filter_masks(fis, in_bundle)
+
+            total_differ = total_same = 0
+            for mask, diffs in zip(masks, object_diffs):
+                if diffs is None:
+                    continue
+                while mask:
+                    bit = (mask & -mask).bit_length() - 1
+                    mask &= mask - 1
+                    differ, same = diffs[bit]
+                    total_differ += differ
+                    total_same += same
+
+            # selections where most of the pixels differ first, and those where none differ last
+            selected = total_differ + total_same
+            return total_differ == 0, -total_differ / max(1, selected), -total_differ
+
+        return sorted(filters_instrs, key=key)
+
+    def widening_limit(self, node):
+        """ maximum number of children node should have (see progressive_widening_constant) """
+        if self.config.progressive_widening_constant <= 0:
+            return None
+        return math.ceil(self.config.progressive_widening_constant *
+                         node.visits ** self.config.progressive_widening_alpha)
+
+    def generate_instructions(self, anode, node, filters_instrs, tis, in_bundle):
+        """ lazily generates the instructions for node, the product of filters x transformations
+        (x dynamic parameter bindings) """
+
+        for fis in filters_instrs:
+            # only generated if needed
+            dyn_params = None
+            for ti in tis:
+                if ti.has_param_binding():
+                    if dyn_params is None:
+                        dyn_params = parameters.generate_dynamic_params(fis, in_bundle)
+
+                    for pbi in dyn_params:
+                        # only added if both ti.has_param_binding() and dyn_params has values
+                        anode.stats.total_instructions += 1
+                        node.total_instructions += 1
+                        yield Instruction(fis, ti, pbi)
+                else:
+                    anode.stats.total_instructions += 1
+                    node.total_instructions += 1
+                    yield Instruction(fis, ti)
+
     def continue_expand_node(self, anode, node, in_bundle):
 
         assert node.todo_instructions
 
         ###############################################################################
-        # create a child per instruction, and score each one
-
-        for ii in range(self.config.expand_children_max):
-            if not node.todo_instructions:
+        # create a child per instruction, and score each one (in batches)
+
+        parallel = self.config.expand_workers > 0
+        if parallel:
+            batch_size = self.config.expand_workers * self.config.expand_chunk_size
+            if self.expander is None:
+                self.expander = ParallelExpander(self.config)
+            self.expander.set_state(anode, in_bundle)
+        else:
+            batch_size = self.config.expand_batch_size
+
+        widening_limit = self.widening_limit(node)
+
+        todo_count = self.config.expand_children_max
+        while todo_count > 0 and node.todo_instructions:
+            if widening_limit is not None and len(node.children) >= widening_limit:
                 break
 
-            instruction = node.todo_instructions.popleft()
-
-            child_node = self.create_child(anode, instruction, in_bundle.copy(), node)
-            if child_node is None:
-                continue
+            instructions = node.todo_instructions.take(min(todo_count, batch_size))
+            todo_count -= len(instructions)
 
-            # XXX the problem here is that we might remove good rules
-            # also for the hashing, we should at least store the instruction for later
-            # XXX idea: maybe pruned and use progressive widening
-            if self.config.do_hashing:
-                if anode.check_seen_token(child_node.token):
-                    # maybe add to pruned
+            if parallel:
+                children = self.create_children_parallel(anode, instructions, node)
+            else:
+                children = self.create_children(anode, instructions, in_bundle, node)
+            for ii, child_node in enumerate(children):
+                if child_node is None:
                     continue
 
-                anode.add_token_to_seen(child_node.token)
+                # XXX the problem here is that we might remove good rules
+                # also for the hashing, we should at least store the instruction for later
+                # XXX idea: maybe pruned and use progressive widening
+                if self.config.do_hashing:
+                    if anode.check_seen_token(child_node.token):
+                        # maybe add to pruned
+                        continue
 
-            node.add(child_node)
-            anode.stats.total_children_added += 1
-            node.best_score = min(node.best_score, child_node.score)
+                    anode.add_token_to_seen(child_node.token)
 
-            if node.best_score == 0:
-                log("Early break expanding children, since found solution")
-                break
+                node.add(child_node)
+                anode.stats.total_children_added += 1
+                node.best_score = min(node.best_score, child_node.score)
 
-            # breakout early?
-            if self.timeout():
-                break
+                stop = False
+                if node.best_score == 0:
+                    log("Early break expanding children, since found solution")
+                    stop = True
 
-    def create_child(self, anode, instr, in_bundle, parent_node):
+                # breakout early?
+                elif self.timeout():
+                    stop = True
+
+                if stop:
+                    # put back the rest of the batch
+                    node.todo_instructions.extendleft(instructions[ii + 1:])
+                    return
+
+    def apply_to_bundle(self, anode, instr, in_bundle):
+        """ applies instruction to in_bundle, returns False if nothing changed (or failed) """
         try:
+            plan = parameters.compile_instruction(instr)
             changed = False
             for ga in in_bundle:
-                if parameters.apply_instruction(ga, instr):
+                if plan(ga):
                     changed = True
-            if not changed:
-                return None
+            return changed
 
         except Exception as e:
             if self.config.verbose_create_child:
@@ -538,6 +877,10 @@ class SearchEngine:
                 traceback.print_exc()
             e = e
             anode.stats.errors_creating_child += 1
+            return False
+
+    def create_child(self, anode, instr, in_bundle, parent_node):
+        if not self.apply_to_bundle(anode, instr, in_bundle):
             return None
 
         score, token = self.score_ga(anode, in_bundle)
@@ -548,6 +891,43 @@ class SearchEngine:
         anode.stats.total_instructions += 1
         return SearchNodeChild(instr, parent_node, score, token)
 
+    def create_children(self, anode, instructions, in_bundle, parent_node):
+        """ same as create_child() for each instruction, but scores children together.  returns
+        a list (child or None) in the same order as instructions. """
+
+        applied = []
+        for ii, instr in enumerate(instructions):
+            child_bundle = in_bundle.snapshot()
+            if self.apply_to_bundle(anode, instr, child_bundle):
+                applied.append((ii, child_bundle))
+
+        scores, tokens = self.score_ga.score_batch(anode, [child_bundle for _, child_bundle in applied])
+
+        children = [None] * len(instructions)
+        for (ii, _), score, token in zip(applied, scores, tokens):
+            if score == -1 or token == -1:
+                anode.stats.errors_creating_child += 1
+                continue
+
+            anode.stats.total_instructions += 1
+            children[ii] = SearchNodeChild(instructions[ii], parent_node, score, token)
+
+        return children
+
+    def create_children_parallel(self, anode, instructions, parent_node):
+        """ same as create_children(), but using worker processes (see ParallelExpander) """
+
+        children = [None] * len(instructions)
+        for ii, score, token in self.expander.expand(instructions):
+            if score == -1 or token == -1:
+                anode.stats.errors_creating_child += 1
+                continue
+
+            anode.stats.total_instructions += 1
+            children[ii] = SearchNodeChild(instructions[ii], parent_node, score, token)
+
+        return children
+
     def backpropagate_score(self, node: SearchTreeNode):
         log(f"backpropagate node: {node}")
 
@@ -566,7 +946,7 @@ class SearchEngine:
             best_score = min(node.original_score, node.best_score, child.score)
             log(f"+CHILD {child} {child.score} --> {best_score}")
 
-            child.score = best_score
+            child.update_score(best_score)
             node = child.search_tree_node
             # update will update the nodes score to the best child
             node.update()
@@ -1,6 +1,8 @@
+import numpy as np
+
 from mcarga.core.baseenum import BaseEnum, auto
 
-from mcarga.statemachine.scoring import arga_basic_scorer, arga_diff_grid_sizes, cmp_scorer
+from mcarga.statemachine import scoring
 
 
 class ScoringFunction(BaseEnum):
@@ -10,9 +12,19 @@ class ScoringFunction(BaseEnum):
 
 
 class Scoring:
-    def __init__(self, config):
+    def __init__(self, config, vectorised=True):
         self.config = config
 
+        # the numpy scorers are the same as the originals, just faster
+        if vectorised:
+            self.arga_basic_scorer = scoring.arga_basic_scorer_np
+            self.arga_diff_grid_sizes = scoring.arga_diff_grid_sizes_np
+            self.cmp_scorer = scoring.cmp_scorer_np
+        else:
+            self.arga_basic_scorer = scoring.arga_basic_scorer
+            self.arga_diff_grid_sizes = scoring.arga_diff_grid_sizes
+            self.cmp_scorer = scoring.cmp_scorer
+
     def __call__(self, anode, in_bundle):
         fn_mapping = {
             ScoringFunction.ORIGINAL_ARGA: self.original_arga,
@@ -25,28 +37,73 @@ class Scoring:
         hash_val = self.hash_bundle(in_bundle)
         return score, hash_val
 
-    def hash_bundle(self, in_bundle):
-        token_strings = []
+    def score_batch(self, anode, in_bundles):
+        """
+        score many candidate bundles at once.  Same as calling __call__() on each, but the
+        reconstructed grids of each training example are scored together as one (N, H, W) array.
+
+        returns (scores, tokens), both lists.  Bundles that fail to reconstruct/hash are returned
+        with a score/token of -1 (rather than failing the whole batch).
+        """
+        if not in_bundles:
+            return [], []
+
+        ok = []
+        rasters = []
+        tokens = [-1] * len(in_bundles)
+        for ii, in_bundle in enumerate(in_bundles):
+            try:
+                bundle_rasters = [ga.get_raster() for ga in in_bundle]
+                tokens[ii] = self.hash_bundle(in_bundle)
+            except Exception:
+                continue
+
+            ok.append(ii)
+            rasters.append(bundle_rasters)
 
-        if self.config.hashing_include_objects_sigs:
-            for ga in in_bundle:
-                for obj in ga.objs:
-                    token_strings.append(str(obj))
-            token_strings.sort()
+        results = [-1] * len(in_bundles)
+        if not ok:
+            return results, tokens
 
-        for ga in in_bundle:
-            reconstructed = ga.undo_abstraction()
+        total_scores = np.zeros(len(ok), dtype=np.int64)
+        for ii, (out_array, orig_array, bg_colour) in enumerate(self.get_targets(anode)):
+            stacked = np.stack([bundle_rasters[ii] for bundle_rasters in rasters])
 
-            num_rows, num_cols = ga.shape
-            for r in range(num_rows):
-                for c in range(num_cols):
-                    pixel = reconstructed[r, c]
-                    token_strings.append(str(pixel))
+            if self.config.scoring_function == ScoringFunction.ORIGINAL_ARGA:
+                scores = scoring.arga_basic_scorer_batch(stacked, out_array, bg_colour)
 
-                token_strings.append("<nextrow>")
-            token_strings.append("<nextinput>")
+            elif self.config.scoring_function == ScoringFunction.DIFF_GRID_SIZES:
+                scores = scoring.arga_diff_grid_sizes_batch(stacked, out_array, bg_colour)
 
-        return hash("".join(token_strings))
+            else:
+                assert self.config.scoring_function == ScoringFunction.PENALISE_DIFF_ORIG_COLOURS
+                scores = scoring.cmp_scorer_batch(stacked, orig_array, out_array)
+
+                # here we add an extra penality for each unsolved training example
+                scores = np.where(scores != 0, scores + 10, scores)
+
+            total_scores = total_scores + scores
+
+        for ii, score in zip(ok, total_scores.tolist()):
+            results[ii] = score
+        return results, tokens
+
+    def get_targets(self, anode):
+        """
+        the targets never change during a search, so are stacked once per AbstractionNode.
+        returns list of (out_array, orig_array, out_bg_colour) per training example.
+        """
+        if anode.scoring_targets is None:
+            task_bundle = anode.task_bundle
+            anode.scoring_targets = [(out_ga.original_array, orig_ga.original_array,
+                                      out_ga.background_colour)
+                                     for out_ga, orig_ga in zip(task_bundle.out_bundle,
+                                                                task_bundle.in_train_bundle)]
+        return anode.scoring_targets
+
+    def hash_bundle(self, in_bundle):
+        include_objects = self.config.hashing_include_objects_sigs
+        return hash(tuple(ga.state_hash(include_objects) for ga in in_bundle))
 
     def original_arga(self, anode, in_bundle):
         out_bundle = anode.task_bundle.out_bundle
@@ -56,9 +113,9 @@ class Scoring:
             assert ga.is_training_graph
 
             bg_colour = out_graph.background_colour
-            reconstructed = ga.undo_abstraction()
+            reconstructed = ga.get_raster()
 
-            total_score += arga_basic_scorer(reconstructed, out_graph.original_grid, bg_colour)
+            total_score += self.arga_basic_scorer(reconstructed, out_graph.original_array, bg_colour)
 
         return total_score
 
@@ -74,9 +131,9 @@ class Scoring:
             assert ga.is_training_graph
 
             bg_colour = out_graph.background_colour
-            reconstructed = ga.undo_abstraction()
+            reconstructed = ga.get_raster()
 
-            score = arga_diff_grid_sizes(reconstructed, out_graph.original_grid, bg_colour)
+            score = self.arga_diff_grid_sizes(reconstructed, out_graph.original_array, bg_colour)
 
             total_score += score
 
@@ -90,9 +147,9 @@ class Scoring:
         for ga, out_ga, orig_ga in zip(in_bundle, out_bundle, orig_in_bundle):
             assert ga.is_training_graph
 
-            reconstructed = ga.undo_abstraction()
+            reconstructed = ga.get_raster()
 
-            score = cmp_scorer(reconstructed, orig_ga.original_grid, out_ga.original_grid)
+            score = self.cmp_scorer(reconstructed, orig_ga.original_array, out_ga.original_array)
 
             # here we add an extra penality for each unsolved training example
             if score != 0:
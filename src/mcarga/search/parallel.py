@@ -0,0 +1,327 @@
+'''
+Running parts of the search in other processes.
+
+Parallel child expansion: the input bundle of the node being expanded is pickled once, and sent
+with each chunk of instructions to a process pool.  The AbstractionNode's task bundle is pickled
+once per AbstractionNode, and only sent to workers that do not have it yet.  Workers unpickle both
+once (caching them by key), apply and score each instruction, and return (instruction_index,
+score, token) tuples.
+
+Root parallel search: each abstraction is searched in its own worker process (with its own
+SearchEngine).  Every root_parallel_sync_interval, workers send their status and the tokens they
+have seen since the last sync to the coordinator.  The coordinator merges these, and passes the
+new tokens (and the best score over all workers) on to the other workers, which add the tokens to
+their seen tokens - so a state already reached by one worker is not expanded again by another.
+Once any worker finds a solution the rest are told to stop.  Workers only send back the best path
+of their search tree (see AbstractionNode.best_path()), so a root parallel search cannot be
+resumed with SearchEngine.run().
+'''
+
+import time
+import queue
+import pickle
+import multiprocessing
+from dataclasses import replace
+from concurrent.futures import ProcessPoolExecutor
+
+from mcarga import parameters
+from mcarga.core.alogger import log
+from mcarga.search.mcts_scoring import Scoring
+
+
+###############################################################################
+# runs in the worker processes
+
+# key -> unpickled input bundle.  Only the latest is kept.
+worker_cache = {}
+
+# key -> AbstractionNode (for its task bundle).  There is one per abstraction, so all are kept.
+worker_anodes = {}
+
+
+def get_cached(key, data):
+    if key not in worker_cache:
+        worker_cache.clear()
+        worker_cache[key] = pickle.loads(data)
+    return worker_cache[key]
+
+
+def expand_chunk(config, anode_key, anode_data, state_key, state_data, indexed_instructions):
+    """
+    apply and score each instruction on (a snapshot of) the input bundle.  Instructions that do
+    not change anything are skipped, and those that fail are returned with a score/token of -1.
+
+    anode_data may be None, if this worker does not have the anode yet returns None (and the
+    chunk is sent again with it).  Otherwise returns list of (instruction_index, score, token)
+    """
+    from mcarga.search.mcts import AbstractionNode
+
+    if anode_key not in worker_anodes:
+        if anode_data is None:
+            return None
+        worker_anodes[anode_key] = AbstractionNode(pickle.loads(anode_data))
+
+    anode = worker_anodes[anode_key]
+    in_bundle = get_cached(state_key, state_data)
+
+    applied = []
+    results = []
+    for index, instr in indexed_instructions:
+        child_bundle = in_bundle.snapshot()
+        try:
+            plan = parameters.compile_instruction(instr)
+            changed = False
+            for ga in child_bundle:
+                if plan(ga):
+                    changed = True
+
+        except Exception:
+            results.append((index, -1, -1))
+            continue
+
+        if changed:
+            applied.append((index, child_bundle))
+
+    scores, tokens = Scoring(config).score_batch(anode, [child_bundle for _, child_bundle in applied])
+    for (index, _), score, token in zip(applied, scores, tokens):
+        results.append((index, score, token))
+
+    results.sort(key=lambda x: x[0])
+    return results
+
+
+###############################################################################
+# runs in the main process
+
+class ParallelExpander:
+    def __init__(self, config):
+        self.config = config
+        self.pool = ProcessPoolExecutor(max_workers=config.expand_workers)
+
+        # anode key -> pickled task bundle, pickled once per AbstractionNode
+        self.anode_data = {}
+        self.anode_key = None
+
+        # state key -> pickled input bundle
+        self.state_key = None
+        self.state_data = None
+        self.state_count = 0
+
+    def set_state(self, anode, in_bundle):
+        """ pickle the input bundle once per node being expanded """
+        self.anode_key = f"{id(self)}:{anode.abstraction}"
+        if self.anode_key not in self.anode_data:
+            # just the task bundle, so we are not pickling the whole search tree
+            self.anode_data[self.anode_key] = pickle.dumps(anode.task_bundle)
+
+        self.state_count += 1
+        self.state_key = f"{id(self)}:{self.state_count}"
+        self.state_data = pickle.dumps(in_bundle)
+
+    def submit(self, chunk, anode_data=None):
+        return self.pool.submit(expand_chunk, self.config, self.anode_key, anode_data,
+                                self.state_key, self.state_data, chunk)
+
+    def expand(self, instructions):
+        """ returns list of (instruction_index, score, token), in order of instruction_index """
+        chunk_size = self.config.expand_chunk_size
+        chunks = [list(enumerate(instructions[start:start + chunk_size], start))
+                  for start in range(0, len(instructions), chunk_size)]
+        futures = [self.submit(chunk) for chunk in chunks]
+
+        results = []
+        for chunk, future in zip(chunks, futures):
+            chunk_results = future.result()
+            if chunk_results is None:
+                # the worker did not have the task bundle yet
+                chunk_results = self.submit(chunk, self.anode_data[self.anode_key]).result()
+            results += chunk_results
+        return results
+
+    def shutdown(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+###############################################################################
+# root parallel search
+
+def search_abstraction(task, config, abstraction, deadline, stop_event, status_queue, sync_queue):
+    """
+    runs in a worker process, searching just the one abstraction until solved, the deadline or
+    told to stop.  returns (status, anodes, tree_playouts), the anodes with just their best path.
+    """
+    from mcarga.search.mcts import SearchEngine, SearchStatus
+
+    if stop_event.is_set():
+        return SearchStatus.NoSolutionFound, [], 0
+
+    config = replace(config, abstractions=[abstraction], root_parallel_workers=0, expand_workers=0,
+                     time_limit=max(0, deadline - time.time()))
+
+    engine = SearchEngine(task, config)
+    engine.deadline = deadline
+
+    # tokens sent to, or received from, the coordinator
+    synced_tokens = set()
+
+    def sync(status):
+        # states the other workers have seen are pruned here too
+        received = set()
+        best_score_all = None
+        while True:
+            try:
+                best_score_all, tokens = sync_queue.get_nowait()
+            except queue.Empty:
+                break
+            received.update(tokens)
+
+        if best_score_all is not None or received:
+            synced_tokens.update(received)
+            for anode in engine.all_anodes:
+                anode.seen_tokens.update(received)
+            log(f"root parallel: {abstraction} received {len(received)} tokens, " +
+                f"best score of all workers: {best_score_all}")
+
+        best_score = engine.all_anodes[0].best_score if engine.all_anodes else None
+        new_tokens = set()
+        for anode in engine.all_anodes:
+            new_tokens.update(anode.seen_tokens - synced_tokens)
+        synced_tokens.update(new_tokens)
+        status_queue.put((abstraction, status, best_score, engine.tree_playouts, new_tokens))
+
+    status = engine.initialise_root()
+    last_sync = time.time()
+    while status == SearchStatus.ContinueRunning:
+        if stop_event.is_set():
+            status = SearchStatus.NoSolutionFound
+            break
+
+        status = engine.tree_playout()
+
+        if time.time() - last_sync > config.root_parallel_sync_interval:
+            sync(status)
+            last_sync = time.time()
+
+    sync(status)
+    return status, [anode.best_path() for anode in engine.all_anodes], engine.tree_playouts
+
+
+class RootParallelSearch:
+    """ coordinates search_abstraction() workers, and puts the results back on the engine """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.config = engine.config
+
+        # abstraction -> latest status from worker
+        self.statuses = {}
+
+        # merged from all the workers
+        self.seen_tokens = set()
+        self.best_score = None
+
+        # abstraction -> exception raised by the worker
+        self.errors = {}
+
+    def solve(self):
+        from mcarga.abstractions import factory
+        from mcarga.search.mcts import SearchStatus
+
+        engine = self.engine
+        deadline = engine.start_time + self.config.time_limit
+
+        # only search distinct abstractions (see create_all())
+        abstraction_bundles = factory.AbstractionFactory().create_all(engine.task,
+                                                                      self.config.abstractions)
+        abstractions = list(abstraction_bundles)
+        log(f"root parallel search of abstractions: {abstractions}")
+
+        manager = multiprocessing.Manager()
+        stop_event = manager.Event()
+        status_queue = manager.Queue()
+
+        # abstraction -> queue of (best_score, tokens) to the worker
+        sync_queues = {abstraction: manager.Queue() for abstraction in abstractions}
+
+        with ProcessPoolExecutor(max_workers=self.config.root_parallel_workers) as pool:
+            futures = [pool.submit(search_abstraction, engine.task, self.config, abstraction,
+                                   deadline, stop_event, status_queue, sync_queues[abstraction])
+                       for abstraction in abstractions]
+
+            while not all(f.done() for f in futures):
+                self.read_statuses(status_queue, stop_event, sync_queues, timeout=0.1)
+
+                if time.time() > deadline + self.config.root_parallel_sync_interval:
+                    stop_event.set()
+
+            self.read_statuses(status_queue, stop_event, sync_queues)
+
+            results = []
+            for abstraction, future in zip(abstractions, futures):
+                try:
+                    results.append(future.result())
+                except Exception as exc:
+                    log(f"root parallel: {abstraction} failed: {exc!r}")
+                    self.errors[abstraction] = repr(exc)
+
+        manager.shutdown()
+
+        if not results and self.errors:
+            raise RuntimeError(f"all root parallel workers failed: {self.errors}")
+
+        engine.all_anodes = []
+        engine.tree_playouts = 0
+        statuses = []
+        for status, anodes, tree_playouts in results:
+            statuses.append(status)
+            for anode in anodes:
+                anode.task_bundle = abstraction_bundles[anode.abstraction]
+            engine.all_anodes += anodes
+            engine.tree_playouts += tree_playouts
+
+        if SearchStatus.SolutionFound in statuses:
+            return SearchStatus.SolutionFound
+
+        if statuses and all(s == SearchStatus.TimeoutInitialiseRoot for s in statuses):
+            return SearchStatus.TimeoutInitialiseRoot
+
+        return SearchStatus.NoSolutionFound
+
+    def read_statuses(self, status_queue, stop_event, sync_queues, timeout=None):
+        """
+        merge the workers' statuses and seen tokens, and pass the new tokens on to the other
+        workers.  Tell the rest to stop once one finds a solution.
+        """
+        from mcarga.search.mcts import SearchStatus
+
+        while True:
+            try:
+                if timeout is None:
+                    msg = status_queue.get_nowait()
+                else:
+                    msg = status_queue.get(timeout=timeout)
+                    timeout = None
+
+            except queue.Empty:
+                return
+
+            abstraction, status, best_score, tree_playouts, tokens = msg
+            self.statuses[abstraction] = status
+
+            tokens = tokens - self.seen_tokens
+            self.seen_tokens.update(tokens)
+            improved = best_score is not None and (self.best_score is None or best_score < self.best_score)
+            if improved:
+                self.best_score = best_score
+
+            log(f"root parallel: {abstraction} {status} best_score: {best_score} " +
+                f"playouts: {tree_playouts} new tokens: {len(tokens)} (all: {len(self.seen_tokens)})")
+
+            if status == SearchStatus.SolutionFound:
+                stop_event.set()
+
+            for other, sync_queue in sync_queues.items():
+                # workers that have finished no longer read their queue
+                running = self.statuses.get(other, SearchStatus.ContinueRunning) == SearchStatus.ContinueRunning
+                if (tokens or improved) and other != abstraction and running:
+                    sync_queue.put((self.best_score, tokens))
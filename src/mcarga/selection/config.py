@@ -1 +1,4 @@
 filter_ops = ["select_all", "by_colour", "by_size", "by_neighbour_size", "by_neighbour_colour"]
+
+# the filters that use the edges (neighbours)
+neighbour_filter_ops = ["by_neighbour_size", "by_neighbour_colour"]
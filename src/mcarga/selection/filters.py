@@ -25,18 +25,7 @@ class Filters:
         '''
 
         obj = self.ga.get_obj(index)
-
-        count = 0
-        for other in self.ga.objs:
-            if obj is other:
-                continue
-
-            if other.get_signature_shape() == obj.get_signature_shape():
-                count += 1
-
-            # no point counting anymore
-            if count > 2:
-                break
+        count = self.ga.get_object_stats().count_similar_shapes(obj)
 
         if number == "many":
             return count > 2
@@ -76,42 +65,25 @@ class Filters:
         if exclude, return true if node does not have size equal to given size.
         """
 
+        stats = self.ga.get_object_stats()
+
         if size == "minmax":
-            max_size = max(obj.size for obj in self.ga.objs)
-            min_size = min(obj.size for obj in self.ga.objs)
             obj = self.ga.get_obj(index)
-            if obj.size in (min_size, max_size):
+            if obj.size in (stats.min_size, stats.max_size):
                 return not exclude
 
         if size == "max":
-            size = max(obj.size for obj in self.ga.objs)
+            size = stats.max_size
 
         elif size == "2nd":
-            # Step 1: Find the maximum size
-            max_size = max(obj.size for obj in self.ga.objs)
-
-            # Step 2: Find the second largest size
-            intermediate = [obj.size for obj in self.ga.objs if obj.size < max_size]
-            if intermediate:
-                size = max(intermediate)
-            else:
-                size = -1
+            # second largest distinct size (or -1 if there is not one)
+            size = stats.size_by_rank(1)
 
         elif size == "3rd":
-            # Step 1: Find the maximum size
-            size = max(obj.size for obj in self.ga.objs)
-
-            for i in range(2):
-                # Step 2: Find the second largest size
-                intermediate = [obj.size for obj in self.ga.objs if obj.size < size]
-                if intermediate:
-                    size = max(intermediate)
-                else:
-                    size = -1
-                    break
+            size = stats.size_by_rank(2)
 
         elif size == "min":
-            size = min(obj.size for obj in self.ga.objs)
+            size = stats.min_size
 
         obj = self.ga.get_obj(index)
         if size == "odd":
@@ -128,16 +100,12 @@ class Filters:
         return true if node has a neighbour of a given size.
         """
         if size == "max":
-            obj = max(self.ga.objs, key=lambda o: o.size)
-            size = obj.size
+            size = self.ga.get_object_stats().max_size
 
         elif size == "min":
-            obj = min(self.ga.objs, key=lambda o: o.size)
-            size = obj.size
+            size = self.ga.get_object_stats().min_size
 
-        obj = self.ga.get_obj(index)
-
-        for neighbour in obj.neighbours():
+        for neighbour in self.ga.neighbours(index):
             if size == "odd":
                 if neighbour.size % 2 != 0:
                     return True
@@ -160,7 +128,7 @@ class Filters:
         elif colour == "least":
             colour = self.ga.least_common_colour
 
-        for neighbour in obj.neighbours():
+        for neighbour in self.ga.neighbours(index):
             if neighbour.colour == colour:
                 return True
         return False
@@ -171,48 +139,93 @@ def apply_filters(filter_instructions: FilterInstructions, ga, index):
     instruction
     """
     the_filterer = Filters(ga)
-    for fi in filter_instructions:
-        func = getattr(the_filterer, fi.name)
-        if not func(index, **fi.params):
+    for func, params in compile_filters(filter_instructions):
+        if not func(the_filterer, index, **params):
             return False
     return True
 
 
+def compile_filters(filter_instructions: FilterInstructions):
+    """ returns list of (unbound Filters method, params), cached on the filter instructions """
+    if not isinstance(filter_instructions, FilterInstructions):
+        # a plain list of FilterInstruction (see get_candidate_filters()), nowhere to cache it
+        return [(getattr(Filters, fi.name), fi.params) for fi in filter_instructions]
+
+    if filter_instructions.compiled is None:
+        filter_instructions.compiled = [(getattr(Filters, fi.name), fi.params)
+                                        for fi in filter_instructions]
+    return filter_instructions.compiled
+
+
+def filter_indices(filter_instructions: FilterInstructions, ga):
+    """ returns the indices of objects in ga that satisfy all the filters """
+    the_filterer = Filters(ga)
+    compiled = compile_filters(filter_instructions)
+
+    indices = []
+    for index in ga.indices():
+        for func, params in compiled:
+            if not func(the_filterer, index, **params):
+                break
+        else:
+            indices.append(index)
+    return indices
+
+
 def gather_filtered_objects(filter_instructions: FilterInstructions,
                             input_graphs_bundle):
     ''' applies the filters to each object in each graph in the bundle. '''
 
+    filtered_indices = []
+    non_empty = []
+    for i, ga in enumerate(input_graphs_bundle):
+        filtered_indices_by_graph = [(i, index) for index in filter_indices(filter_instructions, ga)]
+        non_empty.append(bool(filtered_indices_by_graph))
+        filtered_indices.extend(filtered_indices_by_graph)
+
+    if not is_applicable(non_empty, input_graphs_bundle):
+        return None
+
+    return frozenset(filtered_indices)
+
+
+def is_applicable(non_empty, input_graphs_bundle):
+    ''' non_empty is whether the filter selected any objects, for each graph in the bundle '''
+
     ONLY_ALL_GRAPHS = False
     ONLY_ALL_TEST_GRAPHS = True
 
-    filtered_indices = []
-    missed_count = 0
-    missed_test_count = 0
-    for i, ga in enumerate(input_graphs_bundle):
+    missed = [ga for ga, ok in zip(input_graphs_bundle, non_empty) if not ok]
 
-        filtered_indices_by_graph = []
-        for index in ga.indices():
-            if apply_filters(filter_instructions, ga, index):
-                filtered_indices_by_graph.append((i, index))
+    # if the filter result is the empty set for *all* graphs
+    if len(missed) == len(input_graphs_bundle):
+        return False
 
-        # if the filter result is the empty set for *all* graph - in this case returns None
-        if not filtered_indices_by_graph:
-            missed_count += 1
-            if not ga.is_training_graph:
-                missed_test_count += 1
+    if ONLY_ALL_GRAPHS and missed:
+        return False
 
-        filtered_indices.extend(filtered_indices_by_graph)
+    if ONLY_ALL_TEST_GRAPHS and any(not ga.is_training_graph for ga in missed):
+        return False
 
-    if missed_count == len(input_graphs_bundle):
-        return None
+    return True
 
-    if ONLY_ALL_GRAPHS and missed_count:
-        return None
 
-    if ONLY_ALL_TEST_GRAPHS and missed_test_count:
-        return None
+def filter_masks(filter_instructions: FilterInstructions, input_graphs_bundle):
+    '''
+    the objects selected by the filters, as a bitmask per graph in the bundle (bit i is set if the
+    i-th object of ga.indices() is selected).  Combining filters is then just a bitwise and.
+    '''
+    compiled = compile_filters(filter_instructions)
 
-    return frozenset(filtered_indices)
+    masks = []
+    for ga in input_graphs_bundle:
+        the_filterer = Filters(ga)
+        mask = 0
+        for bit, index in enumerate(ga.indices()):
+            if all(func(the_filterer, index, **params) for func, params in compiled):
+                mask |= 1 << bit
+        masks.append(mask)
+    return tuple(masks)
 
 
 def get_candidate_filters(input_graphs_bundle, do_combined_filters=False):
@@ -230,7 +243,8 @@ def get_candidate_filters(input_graphs_bundle, do_combined_filters=False):
     # list of FilterInstructions
     result_filter_instructions = []
 
-    # use this list to avoid filters that return the same set of nodes
+    # use this to avoid filters that return the same set of nodes.  The selected nodes are
+    # represented as a tuple of bitmasks, one per graph (see filter_masks())
     filtered_objs_all = set()
 
     mapping = {}
@@ -255,10 +269,10 @@ def get_candidate_filters(input_graphs_bundle, do_combined_filters=False):
                 all_candidate_filters.append(candidate_fi)
 
         for candidate_fi in all_candidate_filters:
-            filtered_objs = gather_filtered_objects([candidate_fi], input_graphs_bundle)
+            filtered_objs = filter_masks([candidate_fi], input_graphs_bundle)
 
             # we didn't produce a filtered node for at least one graph
-            if filtered_objs is None:
+            if not is_applicable(filtered_objs, input_graphs_bundle):
                 continue
 
             # check if is duplicate
@@ -266,15 +280,16 @@ def get_candidate_filters(input_graphs_bundle, do_combined_filters=False):
                 continue
 
             filtered_instructions = FilterInstructions(candidate_fi)
+            filtered_instructions.masks = filtered_objs
             mapping[filtered_instructions] = filtered_objs
             filtered_objs_all.add(filtered_objs)
             result_filter_instructions.append(filtered_instructions)
 
         for candidate_fi in all_candidate_filters_excluded:
-            filtered_objs = gather_filtered_objects([candidate_fi], input_graphs_bundle)
+            filtered_objs = filter_masks([candidate_fi], input_graphs_bundle)
 
             # we didn't produce a filtered node for at least one graph
-            if filtered_objs is None:
+            if not is_applicable(filtered_objs, input_graphs_bundle):
                 continue
 
             # check if is duplicate
@@ -282,6 +297,7 @@ def get_candidate_filters(input_graphs_bundle, do_combined_filters=False):
                 continue
 
             filtered_instructions = FilterInstructions(candidate_fi)
+            filtered_instructions.masks = filtered_objs
             mapping[filtered_instructions] = filtered_objs
             filtered_objs_all.add(filtered_objs)
             result_filter_instructions.append(filtered_instructions)
@@ -306,17 +322,19 @@ def get_candidate_filters(input_graphs_bundle, do_combined_filters=False):
             if candidate_fi0.list_of_fi[0].name == candidate_fi1.list_of_fi[0].name:
                 continue
 
-        combined_fis = FilterInstructions(candidate_fi0, candidate_fi1)
-        filtered_objs = gather_filtered_objects(combined_fis, input_graphs_bundle)
+        # AND of the masks, no need to apply the filters again
+        filtered_objs = tuple(m0 & m1 for m0, m1 in zip(mapping[candidate_fi0], mapping[candidate_fi1]))
 
         # we didn't produce a filtered node for at least one graph
-        if filtered_objs is None:
+        if not is_applicable(filtered_objs, input_graphs_bundle):
             continue
 
         # check if is duplicate
         if IGNORE_DUPLICATES and filtered_objs in filtered_objs_all:
             continue
 
+        combined_fis = FilterInstructions(candidate_fi0, candidate_fi1)
+        combined_fis.masks = filtered_objs
         mapping[combined_fis] = filtered_objs
         filtered_objs_all.add(filtered_objs)
         result_filter_instructions.append(combined_fis)
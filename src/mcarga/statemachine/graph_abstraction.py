@@ -2,22 +2,49 @@
 # XXX there is some code duplication here.  See experimental/arc_object.py for alternative implementation.
 
 
+from hashlib import blake2b
 from itertools import combinations
+from collections import Counter
+
+import numpy as np
 
 from common.grid import Grid
 
 
 class ArcObject:
+    # objects are created for every state in the search tree, so keep them small
+    __slots__ = ("index", "colour", "ga", "coord_list", "cached_shape", "cached_array", "cached_bbox")
+
     def __init__(self, index, coords, colour):
         self.index = index
         self.coords = coords
         self.colour = colour
 
-        # might need to be obj -> {}
-        self.edges = []
+        # the GraphAbstraction to tell on update(), set by GraphAbstraction.add_object().  Objects
+        # can be shared between snapshots, so edges are not looked up via this - use
+        # ga.get_edges(index) on the graph in question.
+        self.ga = None
 
-        # lazily computed
+    @property
+    def coords(self):
+        return self.coord_list
+
+    @coords.setter
+    def coords(self, coords):
+        self.coord_list = coords
+        self.clear_cached()
+
+    def clear_cached(self):
+        # derived from coords, lazily computed
         self.cached_shape = None
+        self.cached_array = None
+        self.cached_bbox = None
+
+    def coords_array(self):
+        """ coords as a (n, 2) int16 array, do not modify """
+        if self.cached_array is None:
+            self.cached_array = np.array(self.coord_list, dtype=np.int16).reshape(-1, 2)
+        return self.cached_array
 
     # keeping ArcObject/ArcMultiObject interface aligned
     @property
@@ -30,32 +57,11 @@ class ArcObject:
 
     @property
     def size(self):
-        return len(self.coords)
-
-    def reset_edges(self):
-        self.edges = []
+        return len(self.coord_list)
 
     def safe_coords(self, ga):
         return [coord for coord in self.coords if ga.coord_in_ga(coord)]
 
-    @property
-    def degree(self):
-        return len(self.edges)
-
-    def add_edge(self, other, attribute):
-        assert isinstance(other, ArcObject)
-        self.edges.append((other, attribute))
-
-    def has_edge(self, other):
-        assert isinstance(other, ArcObject)
-        for o, what in self.edges:
-            if o == other:
-                return what
-        return None
-
-    def neighbours(self):
-        return [obj for obj, _ in self.edges]
-
     def get_signature_shape(self):
         """
         get the shape of the object.
@@ -75,52 +81,107 @@ class ArcObject:
         return self.cached_shape
 
     def bounding_box(self):
-        coords = self.coords
-        # XXX optimisation: could do one loop here
-        min_i, min_j = min(i for i, _ in coords), min(j for _, j in coords)
-        max_i, max_j = max(i for i, _ in coords), max(j for _, j in coords)
-        return (min_i, min_j, max_i - min_i + 1, max_j - min_j + 1)
+        if self.cached_bbox is None:
+            self.cached_bbox = bounding_box(self.coords_array())
+        return self.cached_bbox
+
+    def fingerprint(self):
+        return "AO", self.colour, frozenset(self.coords)
+
+    def state_hash(self):
+        # note: no strings, as their hash differs between processes
+        return hash((self.colour, frozenset(self.coords)))
+
+    def raster_pixels(self, height, width):
+        """ returns (rows, cols, colours) arrays of the pixels within a height x width grid """
+        ij = self.coords_array()
+        ij = ij[(ij[:, 0] >= 0) & (ij[:, 1] >= 0) & (ij[:, 0] < height) & (ij[:, 1] < width)]
+        colours = np.full(len(ij), self.colour, dtype=np.int8)
+        return ij[:, 0].astype(np.intp), ij[:, 1].astype(np.intp), colours
 
     def update(self):
         # if we updated any attributes, we need to fix things up.  Do that here.
         # in c++ we will be able to make this immutable or at least const will know what is going on
-        self.cached_shape = None
+        self.clear_cached()
+
+        if self.ga is not None:
+            self.ga.object_updated(self)
 
     def __repr__(self):
         return get_signature_string(self)
 
 
 class ArcMultiObject:
+    __slots__ = ("index", "colour", "ga", "colour_coord_list", "cached_shape", "cached_array",
+                 "cached_bbox", "cached_coords", "cached_colours", "cached_most_common_colour")
+
     def __init__(self, index, colour_coords):
         self.index = index
         self.colour = -1
         self.colour_coords = colour_coords
 
-        self.edges = []
+        # the GraphAbstraction to tell on update(), set by GraphAbstraction.add_object().  Objects
+        # can be shared between snapshots, so edges are not looked up via this - use
+        # ga.get_edges(index) on the graph in question.
+        self.ga = None
 
-        # lazily computed
+    @property
+    def colour_coords(self):
+        return self.colour_coord_list
+
+    @colour_coords.setter
+    def colour_coords(self, colour_coords):
+        self.colour_coord_list = colour_coords
+        self.clear_cached()
+
+    def clear_cached(self):
+        # derived from colour_coords, lazily computed
         self.cached_shape = None
+        self.cached_array = None
+        self.cached_bbox = None
+        self.cached_coords = None
+        self.cached_colours = None
+        self.cached_most_common_colour = None
+
+    def colour_coords_array(self):
+        """ colour_coords as a (n, 3) int16 array of (colour, i, j), do not modify """
+        if self.cached_array is None:
+            self.cached_array = np.array([(c, i, j) for c, (i, j) in self.colour_coord_list],
+                                         dtype=np.int16).reshape(-1, 3)
+        return self.cached_array
+
+    def coords_array(self):
+        """ coords as a (n, 2) int16 array, do not modify """
+        return self.colour_coords_array()[:, 1:]
 
     @property
     def colours(self):
-        all_colours = [c for c, _ in self.colour_coords]
-        return set(all_colours)
+        # a new set each time, so callers are free to modify it
+        return set(self.colour_set())
+
+    def colour_set(self):
+        """ the colours as a frozenset, do not modify """
+        if self.cached_colours is None:
+            self.cached_colours = frozenset(c for c, _ in self.colour_coord_list)
+        return self.cached_colours
 
     @property
     def most_common_colour(self):
-        all_colours = [c for c, _ in self.colour_coords]
-        return max(self.colours, key=all_colours.count)
+        if self.cached_most_common_colour is None:
+            counts = Counter(c for c, _ in self.colour_coord_list)
+            self.cached_most_common_colour = max(self.colour_set(), key=counts.get)
+        return self.cached_most_common_colour
 
     @property
     def size(self):
-        return len(self.colour_coords)
-
-    def reset_edges(self):
-        self.edges = []
+        return len(self.colour_coord_list)
 
     @property
     def coords(self):
-        return [coord for _, coord in self.colour_coords]
+        # do not modify
+        if self.cached_coords is None:
+            self.cached_coords = [coord for _, coord in self.colour_coord_list]
+        return self.cached_coords
 
     def safe_coords(self, ga):
         return [coord for _, coord in self.colour_coords if ga.coord_in_ga(coord)]
@@ -128,27 +189,8 @@ class ArcMultiObject:
     def safe_colour_coords(self, ga):
         return [(colour, coord) for colour, coord in self.colour_coords if ga.coord_in_ga(coord)]
 
-    @property
-    def degree(self):
-        return len(self.edges)
-
-    def add_edge(self, other, attribute):
-        assert isinstance(other, ArcMultiObject)
-        self.edges.append((other, attribute))
-
-    def has_edge(self, other):
-        assert isinstance(other, ArcMultiObject)
-        for o, what in self.edges:
-            if o == other:
-                return what
-        return None
-
     def as_coords(self):
-        return [c for _, c in self.colour_coords]
-
-    def neighbours(self):
-        for obj, _ in self.edges:
-            yield obj
+        return self.coords[:]
 
     def get_signature_shape(self):
         """
@@ -167,22 +209,48 @@ class ArcMultiObject:
         return self.cached_shape
 
     def bounding_box(self):
-        coords = self.coords
+        if self.cached_bbox is None:
+            self.cached_bbox = bounding_box(self.coords_array())
+        return self.cached_bbox
+
+    def fingerprint(self):
+        return "AMO", frozenset(self.colour_coords)
+
+    def state_hash(self):
+        return hash((-1, frozenset(self.colour_coords)))
 
-        # XXX optimisation: could do one loop here
-        min_i, min_j = min(i for i, _ in coords), min(j for _, j in coords)
-        max_i, max_j = max(i for i, _ in coords), max(j for _, j in coords)
-        return (min_i, min_j, max_i - min_i + 1, max_j - min_j + 1)
+    def raster_pixels(self, height, width):
+        """ returns (rows, cols, colours) arrays of the pixels within a height x width grid """
+        cij = self.colour_coords_array()
+        cij = cij[(cij[:, 1] >= 0) & (cij[:, 2] >= 0) & (cij[:, 1] < height) & (cij[:, 2] < width)]
+        return cij[:, 1].astype(np.intp), cij[:, 2].astype(np.intp), cij[:, 0].astype(np.int8)
 
     def update(self):
         # if we updated any attributes, we need to fix things up.  Do that here.
         # in c++ we will be able to make this immutable or at least const will know what is going on
-        self.cached_shape = None
+        self.clear_cached()
+
+        if self.ga is not None:
+            self.ga.object_updated(self)
 
     def __repr__(self):
         return get_signature_string(self)
 
 
+def colour_histogram(array):
+    """ number of pixels of each colour.  Negative colours (-1 is used for no colour) are not
+    counted. """
+    pixels = array.ravel()
+    return np.bincount(pixels[pixels >= 0], minlength=10)
+
+
+def bounding_box(ij):
+    """ (min_i, min_j, height, width) of a (n, 2) array of coords """
+    min_i, min_j = (int(x) for x in ij.min(axis=0))
+    max_i, max_j = (int(x) for x in ij.max(axis=0))
+    return (min_i, min_j, max_i - min_i + 1, max_j - min_j + 1)
+
+
 def copy_object(o):
     if isinstance(o, ArcObject):
         new_o = ArcObject(o.index, o.coords[:], o.colour)
@@ -193,6 +261,39 @@ def copy_object(o):
     return new_o
 
 
+class ObjectStats:
+    '''
+    graph level aggregates over the objects (used by filters), so they are not recomputed for each
+    object.  See GraphAbstraction.get_object_stats(), thrown away whenever an object changes.
+    '''
+
+    def __init__(self, objs):
+        self.objs = objs
+
+        # distinct sizes, largest first
+        self.sizes = sorted(set(obj.size for obj in objs), reverse=True)
+
+        self.shape_counts = None
+
+    def size_by_rank(self, rank):
+        ''' rank 0 is the largest size, -1 if there are not that many distinct sizes '''
+        return self.sizes[rank] if rank < len(self.sizes) else -1
+
+    @property
+    def max_size(self):
+        return self.sizes[0]
+
+    @property
+    def min_size(self):
+        return self.sizes[-1]
+
+    def count_similar_shapes(self, obj):
+        ''' number of *other* objects with the same shape as obj '''
+        if self.shape_counts is None:
+            self.shape_counts = Counter(o.get_signature_shape() for o in self.objs)
+        return self.shape_counts[obj.get_signature_shape()] - 1
+
+
 class GraphAbstraction:
     # set on SearchPerAbstraction - in search.py (XXX hack for now)
     is_training_graph = True
@@ -216,43 +317,124 @@ class GraphAbstraction:
                         (self.height - 1, 0), (self.height - 1, self.width - 1)}
 
         # all objects - simply as dict
-        multicolour_abstractions = ["mcg_nb", "na"]
+        multicolour_abstractions = ["mcg_nb", "mcg_nb_dg", "na"]
         self.is_multicolour = self.abstraction_type in multicolour_abstractions
 
-        # basically a 1d array of each row
-        self.array_1d = []
+        # the original grid as a numpy array, do not modify
+        self.original_array = np.array([list(row) for row in grid], dtype=np.int8).reshape(self.shape)
 
-        for row in grid:
-            for colour in row:
-                self.array_1d.append(colour)
+        # the grid as of the last commit(), and a histogram of its colours (see all_colours etc).
+        # Neither are modified in place.
+        self.colour_grid = self.original_array
+        self.colour_histogram = colour_histogram(self.original_array)
 
-        self.really_most_common_colour = max(self.array_1d, key=self.array_1d.count)
+        # ties go to the colour first seen in the grid
+        counts = self.colour_histogram
+        candidates = np.flatnonzero(counts == counts.max())
+        flat = self.original_array.ravel()
+        self.really_most_common_colour = min(candidates, key=lambda c: np.argmax(flat == c)).item()
 
         self.arc_objs_dict = {}
 
+        # see get_object_stats(), None when it needs recomputing
+        self.object_stats = None
+
+        # edges between objects, index -> list of (other_index, attribute).  The lists are never
+        # modified in place, only replaced (so they can be shared with snapshots).
+        self.edges_by_index = {}
+
+        # indices of objects that are shared with a snapshot (see snapshot())
+        self.shared_indices = set()
+
+        # zobrist style hash of the objects, xor of each object's hash (see state_hash()).
+        # object_hashes is index -> hash currently included, and hash_counts is hash -> number of
+        # objects with that hash.  Identical objects would cancel each other out, so the nth one
+        # is included as hash((obj_hash, n)).
+        self.objects_hash = 0
+        self.object_hashes = {}
+        self.hash_counts = Counter()
+        self.hash_dirty_indices = set()
+
+        # what the edges were last computed against, so they can be updated incrementally (see
+        # update_abstracted_graph()).  edges_raster is never modified in place.  edges_horizontal
+        # and edges_vertical are row/column -> set of pairs of connected indices (see
+        # factory.sweep_edges()).
+        self.edges_horizontal = {}
+        self.edges_vertical = {}
+        self.edges_painted = {}
+        self.edges_raster = None
+        self.edges_background_colour = None
+        self.edges_overlapping = False
+        self.edges_dirty_indices = set()
+
+        # the edges are only computed when first used (see sync_edges()), most graphs never need
+        # them
+        self.edges_need_update = True
+
+        # set after the objects are mutated by an instruction, the edges and colours are then
+        # brought up to date on first use (see commit())
+        self.needs_commit = False
+
+        # the reconstructed grid (see undo_abstraction()) is kept as a persistent raster, which is
+        # updated incrementally as objects are added, removed or updated.  coverage is the number
+        # of objects painted on each pixel, and painted is index -> (rows, cols, colours) of what
+        # each object last painted.  dirty_indices are objects that need repainting.
+        self.raster = np.zeros(self.shape, dtype=np.int8)
+        self.coverage = np.zeros(self.shape, dtype=np.int16)
+        self.painted = {}
+        self.dirty_indices = set()
+        self.raster_needs_rebuild = False
+
+        # (painted rows, coverage) of the last object checked (see own_coverage())
+        self.own_coverage_cache = None, None
+
         # background is zero until told otherwise
         self.set_background_colour(0)
 
     def set_background_colour(self, colour):
         self.background_colour = colour
 
+        # any pixel not covered by an object is background
+        self.raster[self.coverage == 0] = max(0, colour)
+
+    @property
+    def array_1d(self):
+        """ basically a 1d array of each row """
+        self.commit()
+        return self.colour_grid.ravel().tolist()
+
+    def colour_counts(self):
+        """ the colour histogram, excluding the background colour """
+        self.commit()
+        counts = self.colour_histogram.copy()
+        if 0 <= self.background_colour < len(counts):
+            counts[self.background_colour] = 0
+        return counts
+
     @property
     def all_colours(self):
-        array_1d_no_bg = [c for c in self.array_1d if c != self.background_colour]
+        colours = set(np.flatnonzero(self.colour_counts()).tolist())
         # handle weird cases when grid all one colour
-        if not array_1d_no_bg:
-            return set(self.array_1d)
-        return set(array_1d_no_bg)
+        if not colours:
+            return set(np.flatnonzero(self.colour_histogram).tolist())
+        return colours
 
     @property
     def most_common_colour(self):
-        array_1d_no_bg = [c for c in self.array_1d if c != self.background_colour]
-        return max(self.all_colours, key=array_1d_no_bg.count)
+        # ties go to the lowest colour
+        counts = self.colour_counts()
+        return max(sorted(self.all_colours), key=counts.__getitem__)
 
     @property
     def least_common_colour(self):
-        array_1d_no_bg = [c for c in self.array_1d if c != self.background_colour]
-        return min(self.all_colours, key=array_1d_no_bg.count)
+        # ties go to the lowest colour
+        counts = self.colour_counts()
+        return min(sorted(self.all_colours), key=counts.__getitem__)
+
+    def get_object_stats(self):
+        if self.object_stats is None:
+            self.object_stats = ObjectStats(self.objs)
+        return self.object_stats
 
     def all_colours_for_filters(self):
         colours = set()
@@ -282,9 +464,58 @@ class GraphAbstraction:
     def get_obj(self, index):
         return self.arc_objs_dict[index]
 
+    def get_obj_for_update(self, index):
+        """ get an object that is about to be modified.  If shared with a snapshot, it is cloned first. """
+        obj = self.arc_objs_dict[index]
+        if index in self.shared_indices:
+            self.shared_indices.discard(index)
+            obj = copy_object(obj)
+            obj.ga = self
+            self.arc_objs_dict[index] = obj
+        return obj
+
+    def get_edges(self, index):
+        """ returns list of (obj, attribute) """
+        self.sync_edges()
+        return [(self.arc_objs_dict[other_index], attribute)
+                for other_index, attribute in self.edges_by_index.get(index, [])
+                if other_index in self.arc_objs_dict]
+
+    def neighbours(self, index):
+        return [obj for obj, _ in self.get_edges(index)]
+
+    def has_edge(self, index0, index1):
+        self.sync_edges()
+        for other_index, attribute in self.edges_by_index.get(index0, []):
+            if other_index == index1:
+                return attribute
+        return None
+
+    def set_edges(self, edges_by_index):
+        self.edges_by_index = edges_by_index
+
+        self.edges_raster = self.get_raster().copy()
+        self.edges_painted = dict(self.painted)
+        self.edges_background_colour = self.background_colour
+        self.edges_overlapping = self.is_overlapping()
+        self.edges_dirty_indices = set()
+        self.edges_need_update = False
+
+    def set_sweep_edges(self, horizontal, vertical):
+        """ set the edges from the rows/columns swept by factory.sweep_edges() """
+        from mcarga.abstractions.factory import edges_from_sweeps
+
+        self.edges_horizontal = {**self.edges_horizontal, **horizontal}
+        self.edges_vertical = {**self.edges_vertical, **vertical}
+        self.set_edges(edges_from_sweeps(self, self.edges_horizontal, self.edges_vertical))
+
     def all_cords_as_frozen_sets(self):
         return {frozenset(o.coords) for o in self.arc_objs_dict.values()}
 
+    def fingerprint(self):
+        """ canonical (order independent) fingerprint of the objects - type, colours and coords """
+        return frozenset(o.fingerprint() for o in self.arc_objs_dict.values())
+
     def pixel_assignments(self):
         ''' returns which each pixel has an object pointing to '''
         assignments = dict()
@@ -294,64 +525,169 @@ class GraphAbstraction:
                 assignments.setdefault(c, []).append(obj)
         return assignments
 
-    def undo_abstraction(self) -> Grid:
-        # XXX this doesnt handle overlaps
-        bg_colour = max(0, self.background_colour)
-        grid_list = [[bg_colour for r in range(self.width)] for _ in range(self.height)]
-
-        assignments = self.pixel_assignments()
-
-        fast_method = True
-        for _, objs in assignments.items():
-            if len(objs) > 1:
-                # print("WARNING, overlapping objects during undo_abstraction()")
-                fast_method = False
-
-        if fast_method:
-            # no overlapping
-            for obj in self.objs:
-                if isinstance(obj, ArcMultiObject):
-                    for col, (ii, jj) in obj.safe_colour_coords(self):
-                        grid_list[ii][jj] = col
-                else:
-                    assert isinstance(obj, ArcObject)
-                    for ii, jj in obj.safe_coords(self):
-                        grid_list[ii][jj] = obj.colour
-        else:
-            # print("SLOW METHOD")
-            for (i, j), objs in assignments.items():
-                for obj in objs:
-                    obj = objs[0]
-                    if (i, j) not in obj.safe_coords(self):
-                        continue
+    def pixel_owners(self):
+        """ returns which objects own each pixel (within the grid), as (i, j) -> set of indices """
+        self.sync_raster()
+        owners = {}
+        for index, (rows, cols, _) in self.painted.items():
+            for coord in zip(rows.tolist(), cols.tolist()):
+                owners.setdefault(coord, set()).add(index)
+        return owners
+
+    def is_overlapping(self):
+        """ same as checking pixel_assignments() for a pixel with more than one object """
+        self.sync_raster()
+        if (self.coverage > 1).any():
+            return True
+
+        # pixels outside the grid are not painted
+        outside = Counter()
+        for index, (rows, _, _) in self.painted.items():
+            obj = self.arc_objs_dict[index]
+            if len(rows) != obj.size:
+                outside.update(coord for coord in obj.coords if not self.coord_in_ga(coord))
+
+        return any(count > 1 for count in outside.values())
 
-                    if isinstance(obj, ArcMultiObject):
-                        for col, (ii, jj) in obj.safe_coords(self):
-                            if ii == i and jj == j:
-                                grid_list[i][j] = col
+    def undo_abstraction(self) -> Grid:
+        return Grid(self.get_raster().copy())
+
+    def get_raster(self):
+        """ returns the reconstructed grid as a numpy array.  This is not a copy, do not modify. """
+        self.sync_raster()
+        return self.raster
+
+    def object_updated(self, obj):
+        """ called from obj.update() """
+        self.dirty_indices.add(obj.index)
+        self.edges_dirty_indices.add(obj.index)
+        self.hash_dirty_indices.add(obj.index)
+        self.object_stats = None
+
+    def get_objects_hash(self):
+        """ order independent hash of all the objects, updated incrementally """
+        for index in self.hash_dirty_indices:
+            if index in self.object_hashes:
+                obj_hash = self.object_hashes.pop(index)
+                self.objects_hash ^= hash((obj_hash, self.hash_counts[obj_hash]))
+                self.hash_counts[obj_hash] -= 1
+
+            if index in self.arc_objs_dict:
+                obj_hash = self.arc_objs_dict[index].state_hash()
+                self.object_hashes[index] = obj_hash
+                self.hash_counts[obj_hash] += 1
+                self.objects_hash ^= hash((obj_hash, self.hash_counts[obj_hash]))
+
+        self.hash_dirty_indices = set()
+        return self.objects_hash
+
+    def state_hash(self, include_objects=True):
+        """ hash of reconstructed grid, and optionally the objects.  Same across processes. """
+        digest = blake2b(self.get_raster().tobytes(), digest_size=8).digest()
+        raster_hash = self.shape, int.from_bytes(digest, "little")
+        if include_objects:
+            return hash((raster_hash, self.get_objects_hash()))
+        return hash(raster_hash)
+
+    def paint(self, index):
+        obj = self.arc_objs_dict[index]
+        rows, cols, colours = obj.raster_pixels(self.height, self.width)
+
+        np.add.at(self.coverage, (rows, cols), 1)
+
+        # if coords are duplicated - the first one wins
+        _, first = np.unique(rows * self.width + cols, return_index=True)
+        self.raster[rows[first], cols[first]] = colours[first]
+        self.painted[index] = rows, cols, colours
+
+        # overlapping, the first object (in order of objs) wins.  Which is hard to do incrementally.
+        if (self.coverage[rows, cols] > 1).any():
+            self.raster_needs_rebuild = True
+
+    def unpaint(self, index):
+        if index not in self.painted:
+            return
+
+        rows, cols, _ = self.painted.pop(index)
+        np.subtract.at(self.coverage, (rows, cols), 1)
+
+        uncovered = self.coverage[rows, cols] == 0
+        self.raster[rows[uncovered], cols[uncovered]] = max(0, self.background_colour)
+
+        # was overlapping, need to determine who owns the pixel now
+        if not uncovered.all():
+            self.raster_needs_rebuild = True
+
+    def sync_raster(self):
+        self.sync_coverage()
+
+        if self.raster_needs_rebuild:
+            self.rebuild_raster()
+
+    def sync_coverage(self):
+        """ repaint the dirty objects.  coverage and painted are then up to date, but the raster may
+        still need rebuilding (see raster_needs_rebuild) """
+        if self.dirty_indices:
+            dirty_indices = self.dirty_indices
+            self.dirty_indices = set()
+
+            for index in dirty_indices:
+                self.unpaint(index)
+
+            for index in dirty_indices:
+                self.paint(index)
+
+    def rebuild_raster(self):
+        """ repaint the raster from scratch.  Where objects overlap, the first object wins. """
+        self.raster[:] = max(0, self.background_colour)
+        self.coverage[:] = 0
+        self.painted = {}
+        self.dirty_indices = set()
+
+        for index in reversed(self.indices()):
+            self.paint(index)
+
+        self.raster_needs_rebuild = False
+
+    def defer_commit(self):
+        """ the objects have been mutated, commit() on first use of the edges or colours """
+        self.needs_commit = True
+
+    def commit(self):
+        """
+        bring the colours up to date after the objects were mutated (see defer_commit()), and
+        mark the edges as needing an update (see sync_edges()).
+        """
+        if not self.needs_commit:
+            return
+        self.needs_commit = False
 
-                    else:
-                        assert isinstance(obj, ArcObject)
-                        grid_list[i][j] = obj.colour
+        self.fix_up_attrs()
+        self.edges_need_update = True
 
-        return Grid(grid_list)
+    def sync_edges(self):
+        """
+        update the edges if they have not been since the last commit().  Note the edges are as of
+        the first use after the commit, so an instruction that uses the edges must sync them
+        before it modifies any objects (see InstructionPlan).
+        """
+        self.commit()
+        if self.edges_need_update:
+            self.update_abstracted_graph()
 
     def fix_up_attrs(self):
         ''' huge hack - cause we have serious problem with transformations only update objects '''
-        grid = self.undo_abstraction()
-
-        # basically a 1d array of each row
-        self.array_1d = []
 
-        for row in grid:
-            for colour in row:
-                self.array_1d.append(colour)
+        self.colour_grid = self.get_raster().copy()
+        self.colour_histogram = colour_histogram(self.colour_grid)
 
-        most_common_colour = max(self.all_colours, key=self.array_1d.count)
+        most_common_colour = max(self.all_colours, key=self.colour_histogram.__getitem__)
         self.really_most_common_colour = most_common_colour
 
     def copy(self):
         assert self.abstraction_type is not None
+        self.commit()
+
         grid = self.undo_abstraction()
         g = GraphAbstraction(grid, self.abstraction_type)
 
@@ -360,7 +696,51 @@ class GraphAbstraction:
         for o in self.objs:
             g.add_object(o.index, copy_object(o))
 
-        g.update_abstracted_graph()
+        # objects are the same, so no need to repaint
+        g.raster = self.raster.copy()
+        g.coverage = self.coverage.copy()
+        g.painted = dict(self.painted)
+        g.dirty_indices = set()
+
+        # and the edges are updated from ours when first used
+        g.edges_by_index = dict(self.edges_by_index)
+        g.edges_horizontal = self.edges_horizontal
+        g.edges_vertical = self.edges_vertical
+        g.edges_painted = self.edges_painted
+        g.edges_raster = self.edges_raster
+        g.edges_background_colour = self.edges_background_colour
+        g.edges_overlapping = self.edges_overlapping
+        g.edges_dirty_indices = set(self.edges_dirty_indices)
+        g.edges_need_update = True
+        return g
+
+    def snapshot(self):
+        """
+        a copy-on-write copy.  Objects and edges are shared between this and the snapshot until they
+        are modified, hence objects must be fetched via get_obj_for_update() before modifying them.
+        Unlike copy(), the original_grid is shared too.
+        """
+        assert self.abstraction_type is not None
+        self.sync_raster()
+
+        g = GraphAbstraction.__new__(GraphAbstraction)
+        g.__dict__ = self.__dict__.copy()
+
+        # anything that is modified in place needs to be our own
+        g.arc_objs_dict = dict(self.arc_objs_dict)
+        g.edges_by_index = dict(self.edges_by_index)
+        g.raster = self.raster.copy()
+        g.coverage = self.coverage.copy()
+        g.painted = dict(self.painted)
+        g.dirty_indices = set()
+        g.edges_dirty_indices = set(self.edges_dirty_indices)
+        g.object_hashes = dict(self.object_hashes)
+        g.hash_counts = Counter(self.hash_counts)
+        g.hash_dirty_indices = set(self.hash_dirty_indices)
+
+        # all objects are now shared (by both)
+        self.shared_indices = set(self.arc_objs_dict)
+        g.shared_indices = set(self.arc_objs_dict)
         return g
 
     def update_abstracted_graph(self):
@@ -371,30 +751,52 @@ class GraphAbstraction:
         - removing objects
         - inserting objects
         - updating objects
+
+        Only the rows/columns that could have changed are swept again: those where the raster
+        changed, and those covered (before or after) by objects that were updated (see
+        edges_dirty_indices).  The result is the same as rebuild_edges().
         """
-        # XXX just throw away all the edges, and recreate?
 
-        from mcarga.abstractions.factory import Builder
+        from mcarga.abstractions.factory import sweep_edges
 
-        # another horrific hack, just remove and rebuild all the edges
-        for obj in self.objs:
-            obj.reset_edges()
+        if (self.edges_raster is None or self.edges_overlapping or
+                self.edges_background_colour != self.background_colour or self.is_overlapping()):
+            self.rebuild_edges()
+            return
+
+        changed_rows, changed_cols = np.nonzero(self.get_raster() != self.edges_raster)
+        rows, cols = set(changed_rows.tolist()), set(changed_cols.tolist())
+        for index in self.edges_dirty_indices:
+            for painted in self.edges_painted.get(index), self.painted.get(index):
+                if painted is not None:
+                    rows.update(painted[0].tolist())
+                    cols.update(painted[1].tolist())
+
+        if not rows and not cols and not self.edges_dirty_indices:
+            return
 
-        assignments = self.pixel_assignments()
-        for coord, objs in assignments.items():
-            if len(objs) > 1:
-                for obj0, obj1 in combinations(self.objs, 2):
-                    if obj0.has_edge(obj1) != "overlap":
-                        obj0.add_edge(obj1, "overlap")
-                        obj1.add_edge(obj0, "overlap")
+        self.set_sweep_edges(*sweep_edges(self, rows, cols))
 
-        bob = Builder(self)
-        for obj0, obj1 in combinations(self.objs, 2):
-            # dont add edge if overlap already added
-            if obj0.has_edge(obj1) == "overlap":
-                continue
+    def rebuild_edges(self):
+        """ throw away all the edges, and recreate """
 
-            bob.add_edge(obj0, obj1, self.background_colour)
+        from mcarga.abstractions.factory import sweep_edges
+
+        # any overlap, and everything overlaps
+        if self.is_overlapping():
+            edges_by_index = {index: [] for index in self.indices()}
+            for index0, index1 in combinations(self.indices(), 2):
+                edges_by_index[index0].append((index1, "overlap"))
+                edges_by_index[index1].append((index0, "overlap"))
+
+            self.edges_horizontal = {}
+            self.edges_vertical = {}
+            self.set_edges(edges_by_index)
+            return
+
+        self.edges_horizontal = {}
+        self.edges_vertical = {}
+        self.set_sweep_edges(*sweep_edges(self, range(self.height), range(self.width)))
 
     ###############################################################################
     # checks
@@ -413,33 +815,81 @@ class GraphAbstraction:
         """
         check if given coords collide with any other objects in the graph (but not obj)
         returns True if collides.
-        """
-        coords = set(coords)
-        for other in self.objs:
-            if obj is other:
-                continue
 
-            if len(set(other.coords) & coords) != 0:
-                # print(f"collided with {other}")
+        Uses coverage (the number of objects on each pixel) less obj's own coverage, so only coords
+        outside the grid need to look at objects.
+        """
+        self.sync_coverage()
+
+        inside = [c for c in coords if self.coord_in_ga(c)]
+        if inside:
+            rows, cols = np.array(inside, dtype=np.intp).T
+            others = self.coverage[rows, cols]
+            if self.arc_objs_dict.get(obj.index) is obj:
+                others = others - self.own_coverage(obj.index)[rows, cols]
+            if (others > 0).any():
                 return True
+
+        if len(inside) != len(coords):
+            outside = set(coords).difference(inside)
+            for other in self.objs_outside_grid():
+                if obj is not other and not outside.isdisjoint(other.coords):
+                    return True
+
         return False
 
     def check_pixel_occupied(self, coord):
         """ check if a pixel is occupied by any object in the graph """
+        self.sync_coverage()
 
-        for obj in self.objs:
-            for c in obj.coords:
-                if c == coord:
-                    return True
-        return False
+        if self.coord_in_ga(coord):
+            return bool(self.coverage[coord])
+
+        return any(coord in obj.coords for obj in self.objs_outside_grid())
+
+    def own_coverage(self, index):
+        """ coverage of just the object at index (as last painted) """
+        rows, cols, _ = self.painted.get(index, (None, None, None))
+        if rows is None:
+            return np.zeros(self.shape, dtype=np.int16)
+
+        # cached, as the same object is often checked repeatedly (ie pixel by pixel)
+        cached_rows, coverage = self.own_coverage_cache
+        if cached_rows is not rows:
+            coverage = np.zeros(self.shape, dtype=np.int16)
+            np.add.at(coverage, (rows, cols), 1)
+            self.own_coverage_cache = rows, coverage
+        return coverage
+
+    def objs_outside_grid(self):
+        """ objects with coords outside of the grid (ie not all painted) """
+        return [self.arc_objs_dict[index] for index, (rows, _, _) in self.painted.items()
+                if len(rows) != self.arc_objs_dict[index].size]
 
     def add_object(self, index, a_obj):
         assert index not in self.arc_objs_dict
+
         self.arc_objs_dict[index] = a_obj
+        a_obj.ga = self
+        self.dirty_indices.add(index)
+        self.edges_dirty_indices.add(index)
+        self.hash_dirty_indices.add(index)
+        self.object_stats = None
 
     def remove_object(self, index):
         assert index in self.arc_objs_dict
-        self.arc_objs_dict.pop(index)
+        a_obj = self.arc_objs_dict.pop(index)
+        if index in self.shared_indices:
+            self.shared_indices.discard(index)
+        else:
+            a_obj.ga = None
+
+        self.edges_by_index.pop(index, None)
+        self.edges_dirty_indices.add(index)
+        self.hash_dirty_indices.add(index)
+        self.dirty_indices.discard(index)
+        self.object_stats = None
+        self.unpaint(index)
 
     def create_single_obj(self, coords, colour):
         """
@@ -1,3 +1,4 @@
+import numpy as np
 
 
 def arga_basic_scorer(in_grid, out_grid, bg_colour):
@@ -143,3 +144,92 @@ def cmp_scorer(in_grid, orig_grid, out_grid):
 
     return score
 
+
+###############################################################################
+# numpy versions of the above, with identical semantics.  Grids can be numpy arrays or Grids.
+# The batch versions score a stack of N in_grids (N, H, W) at once, returning an array of N scores.
+
+def as_array(grid):
+    if isinstance(grid, np.ndarray):
+        return grid
+    return np.array([list(row) for row in grid])
+
+
+def out_of_bounds_penalty(in_shape, out_shape, penalty):
+    """ the penalty for in_grid and out_grid being different sizes, as arga_diff_grid_sizes() """
+    in_rows, in_cols = in_shape
+    out_rows, out_cols = out_shape
+    rows = min(in_rows, out_rows)
+
+    # in_grid smaller than output
+    score = penalty * out_cols * max(0, out_rows - in_rows)
+    score += penalty * max(0, out_cols - in_cols) * rows
+
+    # XXX as the per pixel versions, this is negative
+    if in_cols > out_cols:
+        score += (out_cols - in_cols) * penalty * rows
+
+    if in_rows > out_rows:
+        score += (in_rows - out_rows) * penalty * in_cols
+
+    return score
+
+
+def arga_basic_scorer_batch(in_grids, out_grid, bg_colour):
+    out_grid = as_array(out_grid)
+    assert in_grids.shape[1:] == out_grid.shape
+
+    incorrect = in_grids != out_grid
+    background = (in_grids == bg_colour) | (out_grid == bg_colour)
+    return incorrect.sum(axis=(1, 2)) + (incorrect & background).sum(axis=(1, 2))
+
+
+def arga_diff_grid_sizes_batch(in_grids, out_grid, bg_colour):
+    out_grid = as_array(out_grid)
+    rows, cols = min(in_grids.shape[1], out_grid.shape[0]), min(in_grids.shape[2], out_grid.shape[1])
+
+    scores = arga_basic_scorer_batch(in_grids[:, :rows, :cols], out_grid[:rows, :cols], bg_colour)
+    return scores + out_of_bounds_penalty(in_grids.shape[1:], out_grid.shape, 3)
+
+
+def cmp_scorer_counts(in_grids, orig_grid, out_grid):
+    """ returns (incorrect pixels same as orig, incorrect pixels different to orig) per in_grid """
+    orig_grid, out_grid = as_array(orig_grid), as_array(out_grid)
+
+    # restriction for now
+    assert in_grids.shape[1:] == orig_grid.shape
+
+    rows, cols = min(in_grids.shape[1], out_grid.shape[0]), min(in_grids.shape[2], out_grid.shape[1])
+    in_grids = in_grids[:, :rows, :cols]
+
+    incorrect = in_grids != out_grid[:rows, :cols]
+    same_as_orig = (incorrect & (in_grids == orig_grid[:rows, :cols])).sum(axis=(1, 2))
+    return same_as_orig, incorrect.sum(axis=(1, 2)) - same_as_orig
+
+
+def cmp_scorer_batch(in_grids, orig_grid, out_grid):
+    same_as_orig, diff_to_orig = cmp_scorer_counts(in_grids, orig_grid, out_grid)
+    penalty = out_of_bounds_penalty(in_grids.shape[1:], as_array(out_grid).shape, 2)
+    return penalty + same_as_orig * 1.0 + diff_to_orig * 1.25
+
+
+def arga_basic_scorer_np(in_grid, out_grid, bg_colour):
+    return int(arga_basic_scorer_batch(as_array(in_grid)[None], out_grid, bg_colour)[0])
+
+
+def arga_diff_grid_sizes_np(in_grid, out_grid, bg_colour):
+    return int(arga_diff_grid_sizes_batch(as_array(in_grid)[None], out_grid, bg_colour)[0])
+
+
+def cmp_scorer_np(in_grid, orig_grid, out_grid):
+    in_grid, out_grid = as_array(in_grid), as_array(out_grid)
+
+    score = out_of_bounds_penalty(in_grid.shape, out_grid.shape, 2)
+    same_as_orig, diff_to_orig = cmp_scorer_counts(in_grid[None], orig_grid, out_grid)
+    same_as_orig, diff_to_orig = int(same_as_orig[0]), int(diff_to_orig[0])
+
+    # keep the same type as cmp_scorer() - only a float if any incorrect pixels
+    if same_as_orig or diff_to_orig:
+        score += same_as_orig * 1.0 + diff_to_orig * 1.25
+
+    return score
@@ -1,4 +1,9 @@
+import numpy as np
+
+from common.grid import Grid
+
 from mcarga.statemachine.scoring import arga_basic_scorer, arga_diff_grid_sizes, cmp_scorer
+from mcarga.statemachine.scoring import arga_basic_scorer_np, arga_diff_grid_sizes_np, cmp_scorer_np
 from .commontest import get_task_bundle
 
 
@@ -81,3 +86,94 @@ def test_cmp_scorer_diff():
 
             # now the score is worse for in_ga
             assert do_cmp_scorer(in_ga, orig_ga, out_ga) > do_cmp_scorer(orig_ga, orig_ga, out_ga)
+
+
+def test_vectorised_scorers():
+    rng = np.random.RandomState(42)
+
+    def random_grid(shape):
+        return Grid(rng.choice([0, 0, 1, 2, 3], size=shape))
+
+    for _ in range(200):
+        in_shape = rng.randint(1, 8), rng.randint(1, 8)
+        if rng.rand() < 0.5:
+            out_shape = in_shape
+        else:
+            out_shape = rng.randint(1, 8), rng.randint(1, 8)
+
+        in_grid, orig_grid, out_grid = random_grid(in_shape), random_grid(in_shape), random_grid(out_shape)
+        if rng.rand() < 0.2:
+            out_grid = in_grid
+
+        for bg_colour in (-1, 0, 1):
+            if in_shape == out_shape:
+                expect = arga_basic_scorer(in_grid, out_grid, bg_colour)
+                assert arga_basic_scorer_np(in_grid, out_grid, bg_colour) == expect
+
+            expect = arga_diff_grid_sizes(in_grid, out_grid, bg_colour)
+            assert arga_diff_grid_sizes_np(in_grid, out_grid, bg_colour) == expect
+
+        expect = cmp_scorer(in_grid, orig_grid, out_grid)
+        score = cmp_scorer_np(in_grid, orig_grid, out_grid)
+        assert score == expect and type(score) is type(expect)
+
+
+def test_score_batch():
+    from mcarga.abstractions.factory import AbstractionFactory, GraphBundle, TaskGraphBundle
+    from mcarga.core.definitions import Direction
+    from mcarga.search.mcts import AbstractionNode, Config
+    from mcarga.search.mcts_scoring import Scoring, ScoringFunction
+    from mcarga.transformations.transformations import Transformations
+
+    in_grids = [[[1, 1, 0, 2],
+                 [1, 1, 0, 2],
+                 [0, 0, 0, 0]],
+                [[0, 3, 0],
+                 [3, 3, 0],
+                 [0, 0, 4]]]
+
+    same_size_out_grids = [[[1, 1, 0, 2],
+                            [1, 1, 0, 2],
+                            [0, 0, 0, 2]],
+                           [[0, 0, 0],
+                            [0, 3, 0],
+                            [3, 3, 4]]]
+
+    diff_size_out_grids = [[[1, 1, 0],
+                            [1, 1, 0]],
+                           [[0, 0, 0, 0],
+                            [0, 3, 0, 0],
+                            [3, 3, 0, 0],
+                            [0, 0, 0, 4]]]
+
+    f = AbstractionFactory()
+
+    def create_bundle(grids):
+        return GraphBundle(f.create("scg_nb", g) for g in grids)
+
+    for scoring_function in ScoringFunction:
+        for out_grids in same_size_out_grids, diff_size_out_grids:
+            if scoring_function == ScoringFunction.ORIGINAL_ARGA and out_grids is diff_size_out_grids:
+                continue
+
+            task_bundle = TaskGraphBundle("scg_nb", create_bundle(in_grids), GraphBundle([]),
+                                          create_bundle(out_grids))
+            anode = AbstractionNode(task_bundle)
+            score_ga = Scoring(Config(scoring_function=scoring_function))
+
+            in_bundles = []
+            for colour in range(5):
+                for direction in (Direction.DOWN, Direction.RIGHT):
+                    in_bundle = anode.orig_input_bundle()
+                    for ga in in_bundle:
+                        t = Transformations(ga)
+                        index = ga.indices()[0]
+                        t.update_colour(index, colour)
+                        t.move_object(index, direction)
+                        ga.update_abstracted_graph()
+                    in_bundles.append(in_bundle)
+
+            scores, tokens = score_ga.score_batch(anode, in_bundles)
+            assert len(scores) == len(tokens) == len(in_bundles)
+            for in_bundle, score, token in zip(in_bundles, scores, tokens):
+                assert (score, token) == score_ga(anode, in_bundle)
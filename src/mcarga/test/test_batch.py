@@ -0,0 +1,23 @@
+from types import SimpleNamespace
+
+from mcarga import batch
+from mcarga.search import mcts
+
+
+def test_result_rows_have_all_fields():
+    engine = mcts.SearchEngine(SimpleNamespace(task_id="abc", test_samples=[]), mcts.Config())
+
+    # timed out before any abstraction had a root node, is unsolved (not an error)
+    engine.status = mcts.SearchStatus.TimeoutInitialiseRoot
+    result = batch.task_result(engine)
+    assert result["status"] == "TimeoutInitialiseRoot"
+    assert result["solved"] is False
+    assert result["best_score"] is None
+
+    rows = [result,
+            batch.result_row("abc", "Killed", time=1.0),
+            batch.result_row("abc", "Crashed", time=1.0, exitcode=-9),
+            batch.result_row("abc", "Error", error="ValueError()"),
+            batch.result_row("abc", "NotRun")]
+    for row in rows:
+        assert tuple(row) == batch.RESULT_FIELDS
@@ -548,9 +548,7 @@ def test_abstraction_edge_preservation():
     ga = factory.create("scg_nb", grid)
 
     def has_edge(index0, index1):
-        o0 = ga.get_obj(index0)
-        o1 = ga.get_obj(index1)
-        return o0.has_edge(o1)
+        return ga.has_edge(index0, index1)
 
     assert has_edge((1, 0), (2, 0)) == "horizontal"
     assert has_edge((1, 0), (3, 0)) == "vertical"
@@ -559,6 +557,71 @@ def test_abstraction_edge_preservation():
     assert has_edge((1, 0), (4, 0)) is None
 
 
+def test_connected_objects():
+    """ numpy labelling should match the original DSL based version (including order) """
+    from mcarga.abstractions.factory import connected_objects, connected_objects_dsl
+
+    rng = np.random.RandomState(42)
+    for _ in range(20):
+        h, w = rng.randint(1, 15), rng.randint(1, 15)
+        grid = Grid(rng.choice([0, 0, 0, 1, 2, 3], size=(h, w)))
+
+        for univalued in (True, False):
+            for diagonal in (True, False):
+                for bg_colour in (-1, 0, 1):
+                    expect = connected_objects_dsl(grid, univalued, diagonal, bg_colour)
+                    assert connected_objects(grid, univalued, diagonal, bg_colour) == expect
+
+
+def test_shared_labelling():
+    from mcarga.abstractions import factory as factory_module
+
+    grid = Grid([[0, 1, 1, 2],
+                 [1, 1, 0, 2],
+                 [0, 0, 3, 3]])
+
+    factory_module.labelling_cache.clear()
+    for name in ["scg", "scg_nb", "scg_nbc", "scg_nb_s1", "scg_nb_s2", "scg_nb_s3"]:
+        ga = factory.create(name, grid)
+        assert ga.undo_abstraction() == grid
+
+    # all share the one labelling
+    assert len(factory_module.labelling_cache) == 1
+
+    expect = factory_module.connected_objects_dsl(grid, True, False, 0)
+    assert factory_module.connected_objects(grid, True, False, 0) == expect
+
+
+def test_sweep_edges():
+    """ edges from sweeping rows/columns should be the same as checking each pair of objects """
+    from itertools import combinations
+    from mcarga.abstractions.factory import is_connected_horizontal, is_connected_vertical
+
+    def edge_attribute(ga, obj0, obj1):
+        grid = ga.get_raster()
+        horizontal = is_connected_horizontal(grid, obj0, obj1, ga.background_colour)
+        vertical = is_connected_vertical(grid, obj0, obj1, ga.background_colour)
+        if horizontal and vertical:
+            return "both"
+        elif horizontal:
+            return "horizontal"
+        elif vertical:
+            return "vertical"
+        return None
+
+    rng = np.random.RandomState(42)
+    for _ in range(10):
+        h, w = rng.randint(3, 12), rng.randint(3, 12)
+        grid = Grid(rng.choice([0, 0, 0, 1, 2, 3], size=(h, w)))
+
+        for name in factory.mapping.keys():
+            ga = factory.create(name, grid)
+            for obj0, obj1 in combinations(ga.objs, 2):
+                expect = edge_attribute(ga, obj0, obj1)
+                assert ga.has_edge(obj0.index, obj1.index) == expect
+                assert ga.has_edge(obj1.index, obj0.index) == expect
+
+
 def test_get_largest_rectangle_graph():
     grid = [
         [1, 1, 1, 0],
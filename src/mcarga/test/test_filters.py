@@ -10,6 +10,7 @@ from mcarga.abstractions.factory import AbstractionFactory, GraphBundle
 from mcarga.gen_values import PossibleValuesFilters
 from mcarga.selection.filters import Filters
 from mcarga.selection import filters
+from mcarga.instruction import FilterInstruction, FilterInstructions
 
 
 def create_ga(g, abstraction="scg_nb"):
@@ -233,6 +234,66 @@ def test_similar_shapes():
     check_only_true((2, 0), 1)
 
 
+def test_object_stats_invalidated():
+    sample_grid = [
+        [0, 1, 1, 0, 2],
+        [0, 1, 2, 0, 2],
+        [0, 2, 2, 0, 2],
+        [3, 3, 0, 0, 0],
+        [3, 3, 0, 0, 0]]
+
+    ga, filters = create_ga(sample_grid)
+    sizes = sorted((o.size for o in ga.objs), reverse=True)
+    assert filters.by_size((3, 0), "max")
+
+    stats = ga.get_object_stats()
+    assert ga.get_object_stats() is stats
+    assert stats.max_size == sizes[0]
+    assert stats.min_size == sizes[-1]
+
+    # grow the smallest object, so it is now the largest
+    index = min(ga.indices(), key=lambda i: ga.get_obj(i).size)
+    obj = ga.get_obj_for_update(index)
+    obj.coords = obj.coords + [(4, 2), (4, 3), (4, 4), (3, 4)]
+    obj.update()
+
+    assert ga.get_object_stats() is not stats
+    assert filters.by_size(index, "max")
+    assert not filters.by_size((3, 0), "max")
+
+    # colour counts are updated with the raster
+    ga.fix_up_attrs()
+    assert ga.most_common_colour == obj.colour
+
+
+def test_filter_masks():
+    sample_grid = [
+        [0, 1, 1, 0, 2],
+        [0, 1, 2, 0, 2],
+        [0, 2, 2, 0, 2],
+        [3, 3, 0, 0, 0],
+        [3, 3, 0, 0, 4]]
+
+    ga, _ = create_ga(sample_grid)
+    bundle = GraphBundle([ga])
+
+    fi0 = FilterInstruction("by_size", dict(size="max", exclude=True))
+    fi1 = FilterInstruction("by_colour", dict(colour=2, exclude=True))
+
+    def selected(masks):
+        return [index for bit, index in enumerate(ga.indices()) if masks[0] & (1 << bit)]
+
+    m0 = filters.filter_masks([fi0], bundle)
+    m1 = filters.filter_masks([fi1], bundle)
+    assert selected(m0) == filters.filter_indices([fi0], ga)
+    assert selected(m1) == filters.filter_indices([fi1], ga)
+
+    # combining is an and of the masks
+    combined = FilterInstructions(fi0, fi1)
+    assert filters.filter_masks(combined, bundle) == (m0[0] & m1[0],)
+    assert selected((m0[0] & m1[0],)) == filters.filter_indices(combined, ga)
+
+
 def test_similar_shapes2():
     sample_grid = [
         [2, 1, 0, 1, 0],
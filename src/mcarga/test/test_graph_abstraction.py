@@ -1,7 +1,7 @@
 import numpy as np
 import pytest
 
-from mcarga.statemachine.graph_abstraction import GraphAbstraction
+from mcarga.statemachine.graph_abstraction import GraphAbstraction, ArcMultiObject
 from mcarga.abstractions.factory import AbstractionFactory
 
 from mcarga.core import utils
@@ -9,6 +9,14 @@ from mcarga.core import utils
 from collections import Counter
 
 
+# four 2x2 objects, one per corner
+four_squares = [[1, 1, 0, 2, 2],
+                [1, 1, 0, 2, 2],
+                [0, 0, 0, 0, 0],
+                [3, 3, 0, 4, 4],
+                [3, 3, 0, 4, 4]]
+
+
 def test_ga_initialization():
     simple_grid = [
         [0, 1, 0],
@@ -71,3 +79,343 @@ def test_bounding_box():
     ga = f.create("scg_nb", grid)
 
     assert ga.get_obj((1, 0)).bounding_box() == (1, 1, 3, 3)
+
+
+def test_raster_incremental():
+    from mcarga.core.definitions import Direction
+    from mcarga.transformations.transformations import Transformations
+
+    grid = four_squares
+
+    f = AbstractionFactory()
+    ga = f.create("scg_nb", grid)
+    assert ga.undo_abstraction() == ga.original_grid
+
+    def check():
+        incremental = ga.get_raster().copy()
+        ga.rebuild_raster()
+        assert (incremental == ga.get_raster()).all()
+
+    t = Transformations(ga)
+    t.update_colour((1, 0), 5)
+    check()
+
+    # overlaps with (2, 0)
+    t.move_object((1, 0), Direction.RIGHT)
+    check()
+
+    # no longer overlaps
+    t.move_object((2, 0), Direction.DOWN)
+    t.move_object((2, 0), Direction.DOWN)
+    check()
+
+    # partly off the grid
+    t.move_object((3, 0), Direction.LEFT)
+    check()
+
+    t.remove_object((4, 0))
+    check()
+
+    t.add_border_around_object((1, 0), 6)
+    check()
+
+    ga.set_background_colour(7)
+    check()
+
+    gb = ga.copy()
+    assert (gb.get_raster() == ga.get_raster()).all()
+    assert gb.undo_abstraction() == ga.undo_abstraction()
+
+
+def test_snapshot():
+    from mcarga.core.definitions import Direction
+    from mcarga.transformations.transformations import Transformations
+
+    grid = four_squares
+
+    f = AbstractionFactory()
+    ga = f.create("scg_nb", grid)
+    orig_grid = ga.undo_abstraction()
+    orig_edges = {index: ga.get_edges(index) for index in ga.indices()}
+
+    snap = ga.snapshot()
+    for index in ga.indices():
+        assert snap.get_obj(index) is ga.get_obj(index)
+
+    t = Transformations(snap)
+    t.update_colour((1, 0), 5)
+    t.move_object((2, 0), Direction.DOWN)
+    t.remove_object((4, 0))
+
+    # only mutated objects are cloned
+    assert snap.get_obj((1, 0)) is not ga.get_obj((1, 0))
+    assert snap.get_obj((2, 0)) is not ga.get_obj((2, 0))
+    assert snap.get_obj((3, 0)) is ga.get_obj((3, 0))
+
+    # (3, 0) is shared, but its edges are not - (4, 0) was removed
+    assert snap.get_edges((3, 0)) == [(snap.get_obj((1, 0)), "vertical")]
+    assert sorted((obj.index, attr) for obj, attr in ga.get_edges((3, 0))) == [
+        ((1, 0), "vertical"), ((4, 0), "horizontal")]
+
+    # parent is untouched
+    assert ga.undo_abstraction() == orig_grid
+    assert ga.get_obj((1, 0)).colour == 1
+    assert (4, 0) in ga.indices()
+    for index in ga.indices():
+        assert ga.get_edges(index) == orig_edges[index]
+
+    # same result as a deep copy
+    gb = ga.copy()
+    t = Transformations(gb)
+    t.update_colour((1, 0), 5)
+    t.move_object((2, 0), Direction.DOWN)
+    t.remove_object((4, 0))
+    assert gb.undo_abstraction() == snap.undo_abstraction()
+
+
+def test_fill_rectangle_multicolour_dg():
+    from mcarga.transformations.transformations import Transformations
+
+    grid = [[1, 2, 0, 0],
+            [0, 1, 0, 3],
+            [0, 0, 0, 0]]
+
+    f = AbstractionFactory()
+    ga = f.create("mcg_nb_dg", grid)
+    assert ga.is_multicolour
+
+    index = [index for index in ga.indices() if ga.get_obj(index).size == 3][0]
+    gb = ga.snapshot()
+    assert Transformations(gb).fill_rectangle(index, 4, True)
+    gb.commit()
+
+    assert all(isinstance(obj, ArcMultiObject) for obj in gb.arc_objs_dict.values())
+    assert gb.undo_abstraction()[1][0] == 4
+
+
+def random_states(rng, count=25, steps=5):
+    """
+    yields graphs of random grids (with a random abstraction), and then after each of up to steps
+    random instructions applied to them
+    """
+    from mcarga.abstractions.factory import GraphBundle
+    from mcarga.instruction import Instruction
+    from mcarga.parameters import apply_instruction
+    from mcarga.selection import filters
+    from mcarga.transformations import transformations
+    from mcarga.transformations import config as tconfig
+
+    f = AbstractionFactory()
+    for _ in range(count):
+        height, width = rng.randint(3, 10), rng.randint(3, 10)
+        grid = [[rng.choice([0, 0, 1, 2, 3]) for _ in range(width)] for _ in range(height)]
+        name = rng.choice(["scg_nb", "scg_nb_dg", "mcg_nb", "na", "scg"])
+
+        ga = f.create(name, grid)
+        yield ga
+
+        bundle = GraphBundle([ga])
+        fis = filters.get_candidate_filters(bundle)
+        tis = [ti for ti in transformations.get_all_transformations(tconfig.get_ops(name), bundle)
+               if not ti.has_param_binding()]
+        if not fis or not tis:
+            continue
+
+        for _ in range(steps):
+            gb = ga.snapshot()
+            try:
+                apply_instruction(gb, Instruction(rng.choice(fis), rng.choice(tis)))
+            except Exception:
+                # some transformations fail on weird objects
+                continue
+
+            yield gb
+            ga = gb
+
+
+def test_incremental_edges():
+    ''' edges updated incrementally should be the same as rebuilding them from scratch '''
+    import random
+
+    for ga in random_states(random.Random(42)):
+        full = ga.copy()
+        full.rebuild_edges()
+        ga.sync_edges()
+        assert ga.edges_by_index == full.edges_by_index
+
+
+def test_collision_checks():
+    ''' check_collision()/check_pixel_occupied() should agree with looking at every object '''
+    import random
+
+    def collides(ga, obj, coords):
+        return any(obj is not other and set(other.coords) & set(coords) for other in ga.objs)
+
+    def occupied(ga, coord):
+        return any(coord in obj.coords for obj in ga.objs)
+
+    rng = random.Random(7)
+    for ga in random_states(rng):
+        # including some off the grid
+        coords = [(rng.randint(-2, ga.height + 1), rng.randint(-2, ga.width + 1)) for _ in range(20)]
+        for coord in coords:
+            assert ga.check_pixel_occupied(coord) == occupied(ga, coord)
+
+        for obj in ga.objs:
+            sample = rng.sample(coords, rng.randint(1, 4))
+            assert ga.check_collision(obj, *sample) == collides(ga, obj, sample)
+
+
+def test_colour_histogram():
+    from mcarga.transformations.transformations import Transformations
+
+    grid = [[1, 1, 0, 2, 2],
+            [1, 1, 0, 2, 0],
+            [0, 0, 0, 0, 0],
+            [3, 3, 0, 0, 0]]
+
+    f = AbstractionFactory()
+    ga = f.create("scg_nb", grid)
+    assert ga.really_most_common_colour == 0
+    assert ga.all_colours == {1, 2, 3}
+    assert ga.most_common_colour == 1
+    assert ga.least_common_colour == 3
+
+    snap = ga.snapshot()
+    Transformations(snap).update_colour((1, 0), 3)
+    snap.fix_up_attrs()
+    assert snap.all_colours == {2, 3}
+    assert snap.most_common_colour == 3
+    assert snap.least_common_colour == 2
+    assert Counter(snap.array_1d) == Counter(snap.get_raster().ravel().tolist())
+
+    # parent is untouched
+    assert ga.all_colours == {1, 2, 3}
+    assert ga.most_common_colour == 1
+
+
+def test_colour_ties():
+    # 8 and 2 share a slot in a small set, so iterate 8 first.  The lowest colour wins a tie.
+    grid = [[8, 0, 2],
+            [8, 0, 2],
+            [0, 6, 0]]
+
+    ga = AbstractionFactory().create("scg_nb", grid)
+    assert ga.most_common_colour == 2
+    assert ga.least_common_colour == 6
+
+    ga = AbstractionFactory().create("scg_nb", [[8, 0, 2]])
+    assert ga.most_common_colour == 2
+    assert ga.least_common_colour == 2
+
+
+def test_colour_histogram_negative():
+    from mcarga.transformations.transformations import Transformations
+
+    ga = AbstractionFactory().create("scg_nb", four_squares)
+
+    # -1 is not counted as a colour (and does not break np.bincount)
+    Transformations(ga).update_colour((1, 0), -1)
+    ga.fix_up_attrs()
+    assert ga.colour_histogram.tolist() == [9, 0, 4, 4, 4, 0, 0, 0, 0, 0]
+    assert ga.all_colours == {2, 3, 4}
+
+
+def test_deferred_commit():
+    from mcarga.instruction import (Instruction, FilterInstruction, FilterInstructions,
+                                    TransformationInstruction)
+    from mcarga.parameters import apply_instruction
+
+    grid = [[1, 1, 0, 2, 2],
+            [1, 1, 0, 2, 0],
+            [0, 0, 0, 0, 0],
+            [3, 3, 0, 0, 0]]
+
+    f = AbstractionFactory()
+    ga = f.create("scg_nb", grid)
+
+    instruction = Instruction(FilterInstructions(FilterInstruction("by_colour", dict(colour=1))),
+                              TransformationInstruction("update_colour", dict(colour=3)))
+
+    gb = ga.snapshot()
+    assert apply_instruction(gb, instruction)
+    assert gb.needs_commit
+    assert not ga.needs_commit
+
+    # raster is up to date, the edges and colours are not until used
+    assert gb.get_raster()[0, 0] == 3
+    assert gb.colour_histogram[1] == 4
+
+    assert gb.all_colours == {2, 3}
+    assert not gb.needs_commit
+
+    # the edges are only updated when used
+    assert gb.edges_need_update
+    assert gb.get_edges((1, 0)) == [(gb.get_obj((3, 0)), "vertical"),
+                                    (gb.get_obj((2, 0)), "horizontal")]
+    assert not gb.edges_need_update
+
+    full = gb.copy()
+    full.rebuild_edges()
+    assert gb.edges_by_index == full.edges_by_index
+
+
+def test_fingerprint():
+    grid = four_squares
+
+    f = AbstractionFactory()
+    ga = f.create("scg_nb", grid)
+
+    # the order of objects/coords does not matter
+    assert ga.fingerprint() == f.create("scg_nb", grid).fingerprint()
+    assert ga.fingerprint() == ga.copy().fingerprint()
+
+    # same coords, but different type of object
+    assert ga.fingerprint() != f.create("mcg_nb", grid).fingerprint()
+
+    # same coords, different colour
+    gb = ga.copy()
+    gb.get_obj((1, 0)).colour = 5
+    assert ga.fingerprint() != gb.fingerprint()
+
+
+def test_state_hash():
+    from mcarga.core.definitions import Direction
+    from mcarga.statemachine.graph_abstraction import copy_object
+    from mcarga.transformations.transformations import Transformations
+
+    grid = four_squares
+
+    f = AbstractionFactory()
+    ga = f.create("scg_nb", grid)
+    orig_hash = ga.state_hash()
+
+    gb = ga.snapshot()
+    t = Transformations(gb)
+    t.update_colour((1, 0), 5)
+    t.move_object((2, 0), Direction.DOWN)
+    t.remove_object((4, 0))
+
+    # incremental hash is the same as computing from scratch
+    assert gb.state_hash() != orig_hash
+    assert gb.state_hash() == gb.copy().state_hash()
+    assert ga.state_hash() == orig_hash
+
+    # and back again
+    t.update_colour((1, 0), 1)
+    t.move_object((2, 0), Direction.UP)
+    gb.add_object((4, 0), copy_object(ga.get_obj((4, 0))))
+    assert gb.state_hash() == orig_hash
+
+    # identical objects do not cancel each other out
+    for index in (1, 1), (1, 2):
+        obj = copy_object(ga.get_obj((1, 0)))
+        obj.index = index
+        gb.add_object(index, obj)
+    assert gb.get_raster().tolist() == ga.get_raster().tolist()
+    assert gb.state_hash() != orig_hash
+    assert gb.state_hash() == gb.copy().state_hash()
+
+    gb.remove_object((1, 1))
+    gb.remove_object((1, 2))
+    assert gb.state_hash() == orig_hash
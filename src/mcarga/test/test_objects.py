@@ -72,8 +72,6 @@ def test_line_abstractions_1():
         [3, 0, 0, 0, 0, 1]
         ]
 
-    grid = Grid(sample_grid)
-
     # vertical and horizontal objects
     vcg_nb = factory.create("vcg_nb", sample_grid)
     hcg_nb = factory.create("hcg_nb", sample_grid)
@@ -94,3 +92,34 @@ def test_line_abstractions_1():
     assert sum(o.size for o in hcg_nb.objs if o.colour == 3) == 3
 
 
+def test_object_cached_attributes():
+    from mcarga.statemachine.graph_abstraction import ArcObject, ArcMultiObject
+
+    obj = ArcObject((1, 0), [(1, 1), (1, 2), (2, 2)], 1)
+    assert obj.bounding_box() == (1, 1, 2, 2)
+    assert obj.get_signature_shape() == ((0, 0), (0, 1), (1, 1))
+
+    # derived attributes follow coords
+    obj.coords = [(3, 3)]
+    assert obj.bounding_box() == (3, 3, 1, 1)
+    assert obj.get_signature_shape() == ((0, 0),)
+    assert obj.coords_array().tolist() == [[3, 3]]
+
+    with pytest.raises(AttributeError):
+        obj.something_else = 1
+
+    mobj = ArcMultiObject((0, 0), [(1, (0, 0)), (2, (0, 1)), (2, (1, 1))])
+    assert mobj.colours == {1, 2}
+    assert mobj.most_common_colour == 2
+
+    # colours is a new set each time, as before it was cached
+    mobj.colours.add(5)
+    assert type(mobj.colours) is set and mobj.colours == {1, 2}
+    assert mobj.coords == [(0, 0), (0, 1), (1, 1)]
+    assert mobj.bounding_box() == (0, 0, 2, 2)
+
+    mobj.colour_coords = [(3, (4, 4)), (3, (4, 5)), (1, (5, 5))]
+    assert mobj.colours == {1, 3}
+    assert mobj.most_common_colour == 3
+    assert mobj.coords == [(4, 4), (4, 5), (5, 5)]
+    assert mobj.bounding_box() == (4, 4, 2, 2)
@@ -47,6 +47,47 @@ def test_apply_instruction():
         print(ga.undo_abstraction())
 
 
+def test_compile_instruction():
+    task = get_task("recolour_easy", show=False)
+    bundle = get_bundle(task, "scg_nb")
+    fis = simple_fi("by_colour", colour=1, exclude=False)
+    ti = TransformationInstruction("update_colour", dict(colour=2))
+    ii = Instruction(fis, ti)
+
+    plan = parameters.compile_instruction(ii)
+    assert parameters.compile_instruction(ii) is plan
+
+    for ga in bundle:
+        expect = ga.copy()
+        parameters.apply_instruction(expect, Instruction(fis, ti))
+
+        plan(ga)
+        assert ga.undo_abstraction() == expect.undo_abstraction()
+
+    # plan is not pickled
+    import pickle
+    assert pickle.loads(pickle.dumps(ii)).plan is None
+
+
+def test_bind_multi_object_colour():
+    from mcarga.instruction import ParamBindingInstruction
+
+    grid = [[1, 2, 0, 0],
+            [0, 0, 0, 0],
+            [0, 3, 4, 0]]
+
+    ga = AbstractionFactory().create("mcg_nb", grid)
+    index0, index1 = ga.indices()
+    assert ga.get_obj(index0).colour == -1
+
+    # the neighbour has no colour (-1) to bind
+    pbi = ParamBindingInstruction("neighbour_by_size", dict(size=2))
+    with pytest.raises(AssertionError):
+        parameters.bind_parameters(index0, ga, pbi, "colour")
+
+    assert parameters.bind_parameters(index0, ga, pbi, "direction") is not None
+
+
 def test_gen_params1():
     task = get_task("recolour_easy", show=False)
     bundle = get_bundle(task, "scg_nb")
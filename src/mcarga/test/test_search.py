@@ -45,6 +45,229 @@ def go(task, **kwds):
         xr.plot()
 
 
+def test_instruction_queue():
+    generated = []
+
+    def gen():
+        for i in range(5):
+            generated.append(i)
+            yield i
+
+    q = mcts.InstructionQueue(gen())
+    assert not generated
+
+    assert q.take(2) == [0, 1]
+    assert generated == [0, 1]
+
+    # put back go first
+    q.extendleft([0, 1])
+    assert q.take(3) == [0, 1, 2]
+    assert q.take(10) == [3, 4]
+    assert not q
+    assert q.generated == 5
+
+
+def test_search_tree_node_update():
+    ''' update() should pick the same child as checking the uct score of every child '''
+    import random
+    rng = random.Random(0)
+
+    mcts.SearchNodeChild.UCB_CONSTANT = 0.85
+    mcts.SearchNodeChild.INITIAL_VISITS_CONSTANT = 4
+
+    node = mcts.SearchTreeNode(None, 100)
+    for i in range(200):
+        node.add(mcts.SearchNodeChild(None, node, rng.randint(1, 120), i))
+
+    for _ in range(1000):
+        best = max(node.children,
+                   key=lambda c: (c.uct_score(node.original_score, node.visits), -c.score, -c.seq))
+
+        child = node.update()
+        assert child is best
+        assert node.best_score == min(c.score for c in node.children)
+
+        node.incr_visits()
+        child.incr_visits()
+        if rng.random() < 0.3:
+            child.update_score(rng.randint(0, child.score))
+
+
+def recolour_anode():
+    """ a small two example task, and instructions recolouring each colour to every other """
+    from mcarga.abstractions.factory import AbstractionFactory, GraphBundle, TaskGraphBundle
+    from mcarga.instruction import (Instruction, FilterInstruction, FilterInstructions,
+                                    TransformationInstruction)
+
+    in_grids = [[[1, 1, 0, 2],
+                 [1, 1, 0, 2],
+                 [0, 0, 0, 0]],
+                [[0, 1, 0],
+                 [1, 1, 0],
+                 [0, 0, 2]]]
+
+    out_grids = [[[3, 3, 0, 2],
+                  [3, 3, 0, 2],
+                  [0, 0, 0, 0]],
+                 [[0, 3, 0],
+                  [3, 3, 0],
+                  [0, 0, 2]]]
+
+    f = AbstractionFactory()
+    task_bundle = TaskGraphBundle("scg_nb",
+                                  GraphBundle(f.create("scg_nb", g) for g in in_grids),
+                                  GraphBundle([]),
+                                  GraphBundle(f.create("scg_nb", g) for g in out_grids))
+    anode = mcts.AbstractionNode(task_bundle)
+
+    instructions = []
+    for colour in 1, 2:
+        for new_colour in range(5):
+            fis = FilterInstructions(FilterInstruction("by_colour", dict(colour=colour, exclude=False)))
+            ti = TransformationInstruction("update_colour", dict(colour=new_colour))
+            instructions.append(Instruction(fis, ti))
+
+    return anode, instructions
+
+
+def test_parallel_expander():
+    ''' the workers should score the same as applying and scoring in this process '''
+    from mcarga.parameters import apply_instruction
+    from mcarga.search.mcts_scoring import Scoring
+    from mcarga.search.parallel import ParallelExpander
+
+    anode, instructions = recolour_anode()
+    config = mcts.Config(expand_workers=2, expand_chunk_size=3)
+
+    expected = []
+    for ii, instruction in enumerate(instructions):
+        in_bundle = anode.orig_input_bundle()
+        if any([apply_instruction(ga, instruction) for ga in in_bundle]):
+            score, token = Scoring(config)(anode, in_bundle)
+            expected.append((ii, score, token))
+
+    expander = ParallelExpander(config)
+    try:
+        # the second time around, the workers already have the task bundle
+        for _ in range(2):
+            expander.set_state(anode, anode.orig_input_bundle())
+            assert expander.expand(instructions) == expected
+    finally:
+        expander.shutdown()
+
+
+def test_create_children_failed_score(monkeypatch):
+    ''' a child which fails to score is counted as an error, the rest of the batch is unaffected '''
+    from mcarga.statemachine.graph_abstraction import GraphAbstraction
+
+    anode, instructions = recolour_anode()
+    engine = mcts.SearchEngine(None, mcts.Config())
+
+    expected = engine.create_children(anode, instructions, anode.orig_input_bundle(), None)
+    assert anode.stats.errors_creating_child == 0
+
+    # pretend reconstructing any grid with colour 4 in it fails
+    get_raster = GraphAbstraction.get_raster
+
+    def broken_get_raster(ga):
+        raster = get_raster(ga)
+        if (raster == 4).any():
+            raise ValueError("broken")
+        return raster
+
+    monkeypatch.setattr(GraphAbstraction, "get_raster", broken_get_raster)
+
+    children = engine.create_children(anode, instructions, anode.orig_input_bundle(), None)
+    assert anode.stats.errors_creating_child == 2
+
+    for instruction, child, expect in zip(instructions, children, expected):
+        if instruction.ti.params["colour"] == 4:
+            assert child is None
+        else:
+            assert (child is None) == (expect is None)
+            if child is not None:
+                assert (child.score, child.token) == (expect.score, expect.token)
+
+
+def test_prioritise_filters():
+    from mcarga.instruction import FilterInstruction, FilterInstructions
+    from mcarga.selection import filters
+
+    anode, _ = recolour_anode()
+    engine = mcts.SearchEngine(None, mcts.Config())
+
+    in_bundle = anode.orig_input_bundle()
+    filters_instrs = filters.get_candidate_filters(in_bundle)
+    assert all(fis.masks is not None for fis in filters_instrs)
+
+    ordered = engine.prioritise_filters(anode, filters_instrs, in_bundle)
+    expect = FilterInstructions(FilterInstruction("by_colour", dict(colour=1, exclude=False)))
+    assert str(ordered[0]) == str(expect)
+
+    # same as applying the filters again
+    for fis in filters_instrs:
+        fis.masks = None
+    assert engine.prioritise_filters(anode, filters_instrs, in_bundle) == ordered
+
+
+def test_best_path():
+    ''' a root parallel worker only sends back the best path, which gives the same solution '''
+    anode, _ = recolour_anode()
+    engine = mcts.SearchEngine(None, mcts.Config())
+    anode.root_node = engine.expand_node(anode, anode.orig_input_bundle(), anode)
+    engine.all_anodes = [anode]
+    expected = engine.get_best_instructions()[1]
+
+    path = anode.best_path()
+    assert path.task_bundle is None and not path.seen_tokens
+    assert len(path.root_node.children) == 1
+    assert path.best_score == anode.best_score
+
+    path.task_bundle = anode.task_bundle
+    engine.all_anodes = [path]
+    assert engine.get_best_instructions() == (path, expected)
+
+
+def test_root_parallel_sync():
+    ''' the coordinator passes on the tokens (and best score) of each worker to the others '''
+    import queue
+    import threading
+    from mcarga.search.parallel import RootParallelSearch
+
+    engine = mcts.SearchEngine(None, mcts.Config())
+    coordinator = RootParallelSearch(engine)
+
+    running = mcts.SearchStatus.ContinueRunning
+    status_queue = queue.Queue()
+    sync_queues = {abstraction: queue.Queue() for abstraction in ("a", "b", "c")}
+    stop_event = threading.Event()
+
+    status_queue.put(("a", running, 10, 5, {1, 2}))
+    status_queue.put(("b", mcts.SearchStatus.NoSolutionFound, 12, 5, {2, 3}))
+    status_queue.put(("c", running, 8, 5, {3, 4}))
+    coordinator.read_statuses(status_queue, stop_event, sync_queues)
+
+    assert coordinator.seen_tokens == {1, 2, 3, 4}
+    assert coordinator.best_score == 8
+    assert not stop_event.is_set()
+
+    def drain(abstraction):
+        msgs = []
+        while not sync_queues[abstraction].empty():
+            msgs.append(sync_queues[abstraction].get_nowait())
+        return msgs
+
+    # b has finished, so is not sent anything.  Only tokens new to the coordinator are sent.
+    assert drain("a") == [(10, {3}), (8, {4})]
+    assert drain("b") == [(10, {1, 2})]
+    assert drain("c") == [(10, {1, 2}), (10, {3})]
+
+    status_queue.put(("a", mcts.SearchStatus.SolutionFound, 0, 6, set()))
+    coordinator.read_statuses(status_queue, stop_event, sync_queues)
+    assert stop_event.is_set()
+    assert drain("c") == [(0, set())]
+
+
 def test_recolour_easy():
     task = get_task("recolour_easy")
     go(task)
@@ -61,6 +284,30 @@ def test_recolour_two_objs():
     go(task)
 
 
+def test_recolour_two_objs__parallel():
+    task = get_task("recolour_two_objs")
+    go(task, expand_workers=2, expand_chunk_size=8)
+
+
+def test_recolour_two_objs__root_parallel():
+    task = get_task("recolour_two_objs")
+    go(task, root_parallel_workers=4)
+
+
+def test_recolour_two_objs__resume():
+    task = get_task("recolour_two_objs")
+    engine = mcts.SearchEngine(task, mcts.Config())
+
+    # search in short slices, continuing where it left off each time
+    for _ in range(100):
+        status = engine.run(1)
+        if status == mcts.SearchStatus.SolutionFound:
+            break
+
+    assert status == mcts.SearchStatus.SolutionFound
+    assert engine.best_score() == 0
+
+
 def test_recolour_two_objs__with_vcg():
     task = get_task("recolour_two_objs")
     go(task, time_limit=30, abstractions=["vcg_nb"])
@@ -104,10 +104,10 @@ def test_move_two_objects():
         obj = ga.get_obj(index)
 
         other = ga.get_obj(indices[1])
-        assert obj.degree == 1
-        assert other.degree == 1
-        assert obj.edges[0] == (other, "horizontal")
-        assert other.edges[0] == (obj, "horizontal")
+        assert len(ga.get_edges(index)) == 1
+        assert len(ga.get_edges(indices[1])) == 1
+        assert ga.get_edges(index)[0] == (other, "horizontal")
+        assert ga.get_edges(indices[1])[0] == (obj, "horizontal")
 
         stored = utils.StoreAttributes.from_obj(obj)
 
@@ -123,15 +123,15 @@ def test_move_two_objects():
         assert obj == ga.get_obj(index)
         assert other == ga.get_obj(indices[1])
 
-        assert obj.degree == 1
-        assert other.degree == 1
+        assert len(ga.get_edges(index)) == 1
+        assert len(ga.get_edges(indices[1])) == 1
 
         if overlap:
-            assert obj.edges[0] == (other, "overlap")
-            assert other.edges[0] == (obj, "overlap")
+            assert ga.get_edges(index)[0] == (other, "overlap")
+            assert ga.get_edges(indices[1])[0] == (obj, "overlap")
         else:
-            assert obj.edges[0] == (other, "horizontal")
-            assert other.edges[0] == (obj, "horizontal")
+            assert ga.get_edges(index)[0] == (other, "horizontal")
+            assert ga.get_edges(indices[1])[0] == (obj, "horizontal")
 
         return ga.undo_abstraction()
 
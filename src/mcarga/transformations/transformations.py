@@ -40,6 +40,7 @@ class Transformations:
         if obj.colour == colour:
             return False
 
+        obj = self.ga.get_obj_for_update(index)
         obj.colour = colour
         obj.update()
         return True
@@ -49,7 +50,7 @@ class Transformations:
         swap from colour x to y
         """
 
-        obj = self.ga.get_obj(index)
+        obj = self.ga.get_obj_for_update(index)
         assert isinstance(obj, ArcMultiObject)
 
         new_coords = []
@@ -115,7 +116,7 @@ class Transformations:
 
         delta_row, delta_col = Direction.deltas(direction)
 
-        obj = self.ga.get_obj(index)
+        obj = self.ga.get_obj_for_update(index)
         updated_coords = [(row + delta_row, col + delta_col) for row, col in obj.coords]
         obj.coords = updated_coords
         obj.update()
@@ -127,7 +128,7 @@ class Transformations:
         """
         assert direction is not None
 
-        obj = self.ga.get_obj(index)
+        obj = self.ga.get_obj_for_update(index)
 
         delta_i, delta_j = Direction.deltas(direction)
 
@@ -157,7 +158,7 @@ class Transformations:
 
         delta_row, delta_col = Direction.deltas(direction)
 
-        obj = self.ga.get_obj(index)
+        obj = self.ga.get_obj_for_update(index)
         updated_coords = obj.coords[:]
         for row_i, col_j in obj.coords:
             max_allowed = 30
@@ -193,7 +194,7 @@ class Transformations:
             mul = -1
 
         # Calculate true center of mass
-        obj = self.ga.get_obj(index)
+        obj = self.ga.get_obj_for_update(index)
         center_i = sum(i for i, _ in obj.coords) / len(obj.coords)
         center_j = sum(j for _, j in obj.coords) / len(obj.coords)
 
@@ -290,10 +291,12 @@ class Transformations:
 
         if isinstance(obj, ArcObject):
             if not self.ga.check_collision(obj, *new_coords):
+                obj = self.ga.get_obj_for_update(index)
                 obj.coords = new_coords
                 obj.update()
         else:
             if not self.ga.check_collision(obj, *[c for _, c in new_coords]):
+                obj = self.ga.get_obj_for_update(index)
                 obj.colour_coords = new_coords
                 obj.update()
         return True
@@ -329,6 +332,7 @@ class Transformations:
             raise ValueError("Invalid mirror axis. One of i or j must be None.")
 
         if not self.ga.check_collision(obj, *new_coords):
+            obj = self.ga.get_obj_for_update(index)
             obj.coords = new_coords
             obj.update()
             return True
@@ -383,6 +387,7 @@ class Transformations:
                 interior_coords.append((i, j))
 
         # Update the original object to be just the border
+        obj = self.ga.get_obj_for_update(index)
         obj.coords = border_coords
         obj.update()
 